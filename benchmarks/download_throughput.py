@@ -0,0 +1,114 @@
+"""
+Benchmark for MoodleAPI.download_file on large files.
+
+Serves a generated file from a local HTTP server and downloads it with the
+previous ``iter_content(8192)`` + ``f.write`` loop and with the readinto path
+(reused buffer, posix_fallocate, incremental hashing). Reports MB/s and CPU
+seconds per GB, and checks that both produce identical files.
+
+    python benchmarks/download_throughput.py [--size-mb N] [--repeat N] [--store]
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pymoodle.api import MoodleAPI
+from pymoodle.session import MoodleSession
+from pymoodle.store import ContentStore
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def legacy_download(session: MoodleSession, url: str, save_path: str, hash_content: bool) -> str:
+    response = session.get(url, stream=True)
+    response.raise_for_status()
+    hasher = hashlib.sha256()
+    with open(save_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if hash_content:
+                hasher.update(chunk)
+            f.write(chunk)
+    return save_path
+
+def measure(func, repeat: int):
+    walls, cpus = [], []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        func()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    return min(walls), min(cpus)
+
+def file_digest(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--store", action="store_true", help="download through a ContentStore (hashing enabled)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pymoodle-bench-")
+    serve_dir = os.path.join(workdir, "serve")
+    os.makedirs(serve_dir)
+    source = os.path.join(serve_dir, "video.bin")
+    with open(source, 'wb') as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            f.write(block)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=serve_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/video.bin"
+
+    try:
+        session = MoodleSession(f"http://127.0.0.1:{server.server_address[1]}/")
+        legacy_path = os.path.join(workdir, "legacy.bin")
+        new_path = os.path.join(workdir, "readinto.bin")
+
+        store = None
+        if args.store:
+            store = ContentStore(os.path.join(workdir, "store"), link_mode="copy")
+        api = MoodleAPI(session, store=store)
+
+        def run_new():
+            if store:
+                # 毎回ネットワークから取得させるため URL インデックスを空にする
+                store._index.clear()
+                shutil.rmtree(store.objects_dir)
+                os.makedirs(store.objects_dir)
+            assert api.download_file(url, new_path) == new_path
+
+        results = [
+            ("iter_content(8192)", measure(lambda: legacy_download(session, url, legacy_path, args.store), args.repeat)),
+            ("readinto", measure(run_new, args.repeat)),
+        ]
+
+        if file_digest(legacy_path) != file_digest(new_path):
+            raise SystemExit("Downloaded files differ")
+
+        gigabytes = args.size_mb / 1024
+        print(f"{args.size_mb} MB over loopback (best of {args.repeat}{', with store' if args.store else ''})")
+        for label, (wall, cpu) in results:
+            print(f"  {label:<20} {args.size_mb / wall:8.1f} MB/s  {cpu / gigabytes:6.2f} CPU s/GB")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Import-time benchmark for the pymoodle package.
+
+Runs ``python -X importtime`` in fresh interpreters for a few entry points and
+reports the cumulative import time of each, plus the slowest modules pulled in.
+``import pymoodle`` must not load requests, bs4, sqlite3 or asyncio; the script
+exits non-zero if it does or if it takes longer than ``--max-ms``.
+
+    python benchmarks/import_time.py [--repeat N] [--max-ms MS] [--top N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+STATEMENTS = [
+    ("import pymoodle", "import pymoodle"),
+    ("exceptions only", "from pymoodle import MoodleError"),
+    ("MoodleSession", "from pymoodle import MoodleSession"),
+    ("MoodleClient", "from pymoodle import MoodleClient"),
+]
+
+# import pymoodle だけでは読み込まれてはいけないモジュール
+HEAVY_MODULES = ["requests", "bs4", "sqlite3", "asyncio", "pymoodle.client", "pymoodle.api", "pymoodle.parsers"]
+
+def run_importtime(statement: str) -> Dict[str, Tuple[int, int, int]]:
+    """Returns {module: (self_us, cumulative_us, depth)} for a fresh interpreter running the statement."""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, env=env, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        timings[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return timings
+
+def statement_total(timings: Dict[str, Tuple[int, int, int]], startup: Dict[str, Tuple[int, int, int]]) -> int:
+    """Sums the cumulative time of the top-level imports that interpreter startup does not already do."""
+    # __getattr__ 経由の import_module() は -X importtime に親モジュールの行を残さないため、
+    # 最上位の import をすべて合計する
+    return sum(cumulative for name, (_, cumulative, depth) in timings.items()
+               if depth == 0 and name not in startup)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=50.0, help="budget for a bare 'import pymoodle'")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    startup = run_importtime("pass")
+    failed = False
+    for label, statement in STATEMENTS:
+        runs = [run_importtime(statement) for _ in range(args.repeat)]
+        totals = [statement_total(timings, startup) / 1000 for timings in runs]
+        median = statistics.median(totals)
+        print(f"{label:<18} {median:8.1f} ms (min {min(totals):.1f}, max {max(totals):.1f})")
+
+        if statement == "import pymoodle":
+            loaded = [name for name in HEAVY_MODULES if name in runs[0]]
+            if loaded:
+                print(f"  FAIL: 'import pymoodle' loaded {', '.join(loaded)}")
+                failed = True
+            if median > args.max_ms:
+                print(f"  FAIL: 'import pymoodle' took {median:.1f} ms (budget {args.max_ms} ms)")
+                failed = True
+
+        own = {name: t for name, t in runs[0].items() if name not in startup}
+        slowest = sorted(own.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        for name, (self_us, cumulative_us, _) in slowest:
+            print(f"    {self_us / 1000:7.2f} ms self  {cumulative_us / 1000:7.2f} ms cumulative  {name}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
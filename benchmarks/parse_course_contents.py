@@ -0,0 +1,144 @@
+"""
+Benchmark for parsers.parse_course_contents on large course pages.
+
+Generates a synthetic course page (default: 40 sections x 40 activities) and
+compares the single-pass module walker with the previous CSS select() based
+implementation. Also checks that both produce identical output.
+
+    python benchmarks/parse_course_contents.py [--sections N] [--activities N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bs4 import BeautifulSoup
+from pymoodle import parsers
+from pymoodle.types import Module, Section
+
+MODTYPES = ["resource", "assign", "quiz", "url", "page", "forum", "folder"]
+
+def build_course_html(sections: int, activities: int) -> str:
+    parts = ['<html><body><div class="course-content"><ul class="topics">']
+    for s in range(sections):
+        parts.append(
+            f'<li id="section-{s}" class="section main clearfix" data-sectionid="{s}">'
+            f'<div class="content"><h3 class="sectionname"><span>Week {s}</span></h3>'
+            f'<div class="summary"><p>Summary of week {s}</p></div><ul class="section img-text">'
+        )
+        for a in range(activities):
+            mod_id = s * 10000 + a
+            modtype = MODTYPES[a % len(MODTYPES)]
+            done = "完了: Item" if a % 3 else "未完了: Item"
+            desc = (
+                f'<div class="contentafterlink"><div class="no-overflow"><p>Line one {a}</p>'
+                f'<p>Line <b>two</b> <!-- note --> {a}</p></div></div>'
+                if a % 2 else ""
+            )
+            parts.append(
+                f'<li class="activity {modtype} modtype_{modtype}" id="module-{mod_id}">'
+                f'<div><div class="mod-indent-outer"><div class="activityinstance">'
+                f'<a class="aalink" href="https://moodle.example/mod/{modtype}/view.php?id={mod_id}">'
+                f'<img src="icon.svg" class="iconlarge activityicon" alt="">'
+                f'<span class="instancename">Activity {a} &amp; more'
+                f'<span class="accesshide "> {modtype}</span></span></a></div>'
+                f'{desc}'
+                f'<span class="actions"><span class="autocompletion">'
+                f'<img class="icon" title="{done}" alt="{done}" src="c.svg"></span></span>'
+                f'</div></div></li>'
+            )
+        parts.append('</ul></div></li>')
+    parts.append('</ul></div></body></html>')
+    return "".join(parts)
+
+def legacy_parse_course_contents(html: str) -> List[Section]:
+    """The CSS select() based implementation that parse_course_contents replaced."""
+    soup = BeautifulSoup(html, 'html.parser')
+    sections: List[Section] = []
+
+    topic_list = soup.select('ul.topics li.section.main')
+    if not topic_list:
+         topic_list = soup.select('.course-content ul.topics li.section.main') or \
+                      soup.select('.course-content ul.weeks li.section.main')
+
+    for section in topic_list:
+        section_id = section.get('data-sectionid')
+        name_tag = section.select_one('.sectionname')
+        section_name = name_tag.get_text(strip=True) if name_tag else f"Section {section_id}"
+        summary_tag = section.select_one('.summary')
+        section_summary = summary_tag.get_text(strip=True) if summary_tag else ""
+
+        modules: List[Module] = []
+        for mod in section.select('ul.section li.activity'):
+            mod_id_str = mod.get('id')
+            mod_id = int(mod_id_str.replace('module-', '')) if mod_id_str else None
+            mod_type = "unknown"
+            for c in mod.get('class', []):
+                if c.startswith('modtype_'):
+                    mod_type = c.replace('modtype_', '')
+                    break
+
+            instancename_tag = mod.select_one('.instancename')
+            link_tag = mod.select_one('.activityinstance a')
+            if instancename_tag:
+                for hidden in instancename_tag.select('.accesshide'):
+                    hidden.decompose()
+                mod_name = instancename_tag.get_text(strip=True)
+            else:
+                mod_name = "Untitled"
+            mod_url = link_tag['href'] if link_tag else None
+
+            description = None
+            desc_tag = mod.select_one('.contentafterlink')
+            if desc_tag:
+                description = desc_tag.get_text(separator="\n", strip=True)
+
+            is_completed = False
+            completion_icon = mod.select_one('.autocompletion img')
+            if completion_icon:
+                title = completion_icon.get('title', '') or completion_icon.get('alt', '')
+                if "完了: " in title and "未完了" not in title:
+                    is_completed = True
+
+            modules.append(Module(id=mod_id, type=mod_type, name=mod_name, url=mod_url,
+                                  description=description, completed=is_completed))
+        sections.append(Section(id=section_id, name=section_name, summary=section_summary, modules=modules))
+    return sections
+
+def best_of(func, html: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=40)
+    parser.add_argument("--activities", type=int, default=40, help="activities per section")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    html = build_course_html(args.sections, args.activities)
+    total = args.sections * args.activities
+
+    if parsers.parse_course_contents(html) != legacy_parse_course_contents(html):
+        print("ERROR: outputs differ")
+        sys.exit(1)
+
+    # HTML のパース自体のコストを分けて表示する
+    soup_time = best_of(lambda h: BeautifulSoup(h, 'html.parser'), html, args.repeat)
+    legacy = best_of(legacy_parse_course_contents, html, args.repeat)
+    current = best_of(parsers.parse_course_contents, html, args.repeat)
+
+    print(f"{total} activities, {len(html) / 1024:.0f} KiB of HTML (outputs identical)")
+    print(f"  BeautifulSoup only : {soup_time * 1000:8.1f} ms")
+    print(f"  legacy select()    : {legacy * 1000:8.1f} ms  (extraction {(legacy - soup_time) * 1000:.1f} ms)")
+    print(f"  single-pass walker : {current * 1000:8.1f} ms  (extraction {(current - soup_time) * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
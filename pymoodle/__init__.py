@@ -1,14 +1,61 @@
-from .client import MoodleClient
-from .session import MoodleSession
-from .api import MoodleAPI
+from typing import TYPE_CHECKING
+from importlib import import_module
+
 from .exceptions import MoodleError, MoodleLoginError, MoodleRequestError, MoodleParseError
 
+if TYPE_CHECKING:
+    from .client import MoodleClient
+    from .session import MoodleSession
+    from .api import MoodleAPI
+    from .store import ContentStore
+    from .watcher import CourseWatcher
+    from .index import MoodleIndex
+    from .assets import AssetHarvester
+    from .resolver import ModuleURLResolver
+    from .crawl import CrawlJob
+    from .pool import MoodleClientPool
+    from .downloads import DownloadScheduler
+
+# requests / bs4 / sqlite3 / asyncio を読み込むモジュールは最初にアクセスされた時点で import する
+_LAZY_ATTRS = {
+    "MoodleClient": ".client",
+    "MoodleSession": ".session",
+    "MoodleAPI": ".api",
+    "ContentStore": ".store",
+    "CourseWatcher": ".watcher",
+    "MoodleIndex": ".index",
+    "AssetHarvester": ".assets",
+    "ModuleURLResolver": ".resolver",
+    "CrawlJob": ".crawl",
+    "MoodleClientPool": ".pool",
+    "DownloadScheduler": ".downloads",
+}
+
 __all__ = [
     "MoodleClient",
     "MoodleSession",
     "MoodleAPI",
+    "ContentStore",
+    "CourseWatcher",
+    "MoodleIndex",
+    "AssetHarvester",
+    "ModuleURLResolver",
+    "CrawlJob",
+    "MoodleClientPool",
+    "DownloadScheduler",
     "MoodleError",
     "MoodleLoginError",
     "MoodleRequestError",
     "MoodleParseError",
 ]
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,10 +1,20 @@
-from typing import List, Optional
+from typing import Callable, List, Optional, Dict, Tuple, Iterator
 import os
-from urllib.parse import urljoin
+import json
+import time
+import tempfile
+import threading
+from datetime import tzinfo
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from urllib.parse import urljoin, urlparse, parse_qs, parse_qsl, urlencode
 import logging
 from pymoodle.session import MoodleSession
-from pymoodle import parsers, utils
-from pymoodle.types import Course, Category, Section, FolderDetails, AssignmentDetails, ForumDetails, PageDetails, QuizDetails, QuizAttemptData
+from pymoodle import parsers, utils, diff, profiles
+from pymoodle.store import ContentStore, StoreEntry
+from pymoodle.singleflight import SingleFlight
+from pymoodle.streaming import ResourceLinkFinder, QuizStartFinder, scan_response
+from pymoodle.resolver import resource_revision
+from pymoodle.types import Validator, Course, Category, CategoryNode, CourseChange, Section, SectionInfo, Module, FolderDetails, AssignmentDetails, AssignmentDeadline, ForumDetails, ForumDiscussion, ForumPost, PageDetails, QuizDetails, QuizAttemptData, QuizReview, ResolvedURL, HydratedModule, HydratedCourse, CourseGrade, GradeItem
 from pymoodle.exceptions import MoodleRequestError, MoodleParseError
 
 logger = logging.getLogger(__name__)
@@ -13,30 +23,331 @@ class MoodleAPI:
     """
     Provides specific Moodle functionality using MoodleSession.
     """
-    def __init__(self, session: MoodleSession):
+    # hydrate_course が詳細ページを取得するモジュール種別: type -> (ビューページ, パーサー)
+    DETAIL_PAGES = {
+        'assign': ("mod/assign/view.php", parsers.parse_assignment),
+        'quiz': ("mod/quiz/view.php", parsers.parse_quiz),
+        'folder': ("mod/folder/view.php", parsers.parse_folder),
+        'page': ("mod/page/view.php", parsers.parse_page),
+        'forum': ("mod/forum/view.php", parsers.parse_forum),
+    }
+    HYDRATE_TYPES = tuple(DETAIL_PAGES) + ('resource', 'url')
+
+    def __init__(self, session: MoodleSession, store: Optional[ContentStore] = None):
         self.session = session
+        self.store = store
+        self._category_cache: Dict[Tuple[int, bool], Tuple[List[Category], List[Course]]] = {}
+        # 終了した受験のレビューは変化しないので、一度取得したら再取得しない
+        self._review_cache: Dict[str, QuizReview] = {}
+        # 評定済みの課題は状態が確定しているので再取得しない
+        self._final_assignments: Dict[int, AssignmentDetails] = {}
+        # 同じページを同時に取得・解析する呼び出しを 1 回にまとめる
+        self._flights = SingleFlight()
+        self._sesskey: Optional[str] = None
+        # 保存・復元できるページキャッシュ: key -> (解析結果, Validator, 取得時刻)
+        # key は 'courses', 'course:<id>', 'grades' または 'grades:<id>'
+        self._page_cache: Dict[str, Tuple[object, Validator, float]] = {}
+        # load_state で復元され、まだ再検証していないキー
+        self._stale_keys = set()
+        self._revalidator: Optional[ThreadPoolExecutor] = None
+        self._revalidations = []
+        self._cache_lock = threading.Lock()
+        # hydrate_course の結果: (type, module id) -> (詳細, Validator, コースページ上のモジュールの内容)
+        self._module_details: Dict[Tuple[str, int], Tuple[object, Optional[Validator], tuple, float]] = {}
+
+    def _get_parsed(self, url: str, parse, *args):
+        """
+        Fetches a page and parses it. Concurrent calls for the same page share
+        the request and the parsed object, so callers must not mutate the result.
+        """
+        return self._flights.do((url, parse, args), lambda: self._fetch_parsed(url, parse, args))
+
+    def _fetch_parsed(self, url: str, parse, args: tuple):
+        response = self.session.get(url)
+        response.raise_for_status()
+        self._check_session(response)
+        return parse(response.text, *args, profile=self.site_profile(response.text))
+
+    def get_parsed_page(self, url: str, parse, *args):
+        """
+        Fetches a page (absolute, or relative to base_url) and parses it with
+        ``parse(html, *args, profile=...)``. Unlike the get_* methods, errors are
+        raised (MoodleRequestError, including when the session has expired),
+        so callers can retry.
+        """
+        return self._get_parsed(urljoin(self.session.base_url, url), parse, *args)
+
+    async def get_parsed_page_async(self, url: str, parse, *args):
+        """
+        get_parsed_page() for asyncio code. The fetch and the parse run in the
+        default executor, and concurrent awaits for the same page share both.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        url = urljoin(self.session.base_url, url)
+        return await self._flights.do_async(
+            (url, parse, args),
+            lambda: loop.run_in_executor(None, lambda: self._fetch_parsed(url, parse, args))
+        )
+
+    def _check_session(self, response):
+        """Raises MoodleRequestError if the request was redirected to the login page."""
+        if response.url and urlparse(response.url).path.endswith('/login/index.php'):
+            raise MoodleRequestError(f"Session expired (redirected to {response.url})")
+
+    def site_profile(self, html: Optional[str] = None) -> Optional[profiles.SiteProfile]:
+        """
+        Returns the detected language / theme / version profile of this site
+        (shared by every MoodleAPI for the same base_url), detecting it from ``html`` if needed.
+        """
+        return profiles.profile_for(self.session.base_url, html)
+
+    def _remember_page(self, key: str, value, validator: Optional[Validator]):
+        with self._cache_lock:
+            self._page_cache[key] = (value, validator or Validator(None, None), time.time())
+            self._stale_keys.discard(key)
+
+    def _cached_page(self, key: str, url: str, parse):
+        """
+        Returns a page restored by load_state without a request, and schedules
+        its revalidation in the background. Returns None for anything else.
+        """
+        with self._cache_lock:
+            if key not in self._stale_keys:
+                return None
+            self._stale_keys.discard(key)
+            value, validator, _ = self._page_cache[key]
+            if self._revalidator is None:
+                self._revalidator = ThreadPoolExecutor(max_workers=2)
+            self._revalidations.append(self._revalidator.submit(self._revalidate, key, url, parse, validator))
+        return value
+
+    def _revalidate(self, key: str, url: str, parse, validator: Validator):
+        try:
+            response, new_validator = self.session.conditional_get(url, validator)
+            if response is None:
+                logger.debug(f"Cached {key} is still valid")
+                with self._cache_lock:
+                    value = self._page_cache[key][0]
+                self._remember_page(key, value, validator)
+                return
+            # ログインページをダッシュボードとして解析してキャッシュしないようにする
+            self._check_session(response)
+            value = parse(response.text, profile=self.site_profile(response.text))
+            self._remember_page(key, value, new_validator)
+            logger.debug(f"Revalidated {key}")
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error revalidating {key}: {e}")
+
+    def _revalidated_page(self, key: str, url: str, parse, max_age: Optional[float] = None):
+        """
+        Returns a cached page, revalidated with a conditional request (the
+        cached value is served on 304 Not Modified). Within ``max_age`` seconds
+        of the last check the cached value is returned without any request.
+        """
+        with self._cache_lock:
+            cached = self._page_cache.get(key)
+        if cached is not None and max_age is not None and time.time() - cached[2] < max_age:
+            return cached[0]
+
+        def fetch():
+            response, validator = self.session.conditional_get(url, cached[1] if cached else None)
+            if response is None:
+                logger.debug(f"Cached {key} is still valid")
+                value = cached[0]
+            else:
+                self._check_session(response)
+                value = parse(response.text, profile=self.site_profile(response.text))
+            self._remember_page(key, value, validator)
+            return value
+        return self._flights.do(('page', key), fetch)
+
+    def wait_for_revalidation(self, timeout: Optional[float] = None):
+        """Blocks until the background revalidations scheduled so far have finished."""
+        with self._cache_lock:
+            pending, self._revalidations = self._revalidations, []
+        wait(pending, timeout=timeout)
+
+    def get_cache_state(self) -> Dict:
+        """Returns the sesskey and cached pages (with validators) for MoodleClient.save_state."""
+        with self._cache_lock:
+            return {'sesskey': self._sesskey, 'pages': dict(self._page_cache)}
+
+    def restore_cache_state(self, state: Dict):
+        """Restores get_cache_state() output. Restored pages are served once and revalidated in the background."""
+        with self._cache_lock:
+            self._sesskey = state.get('sesskey') or self._sesskey
+            self._page_cache.update(state.get('pages', {}))
+            self._stale_keys.update(state.get('pages', {}))
+
+    def _parse_dashboard(self, html: str, profile: Optional[profiles.SiteProfile] = None) -> List[Course]:
+        # ダッシュボードには sesskey も含まれているので、ついでに更新する
+        self._sesskey = parsers.parse_sesskey(html) or self._sesskey
+        return parsers.parse_my_courses(html, profile)
 
     def get_my_courses(self) -> List[Course]:
+        cached = self._cached_page('courses', self.session.base_url, self._parse_dashboard)
+        if cached is not None:
+            return cached
+
         logger.info(f"Fetching dashboard: {self.session.base_url}")
         try:
-            response = self.session.get(self.session.base_url)
-            response.raise_for_status()
-            return parsers.parse_my_courses(response.text)
+            return self._revalidated_page('courses', self.session.base_url, self._parse_dashboard)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error fetching dashboard: {e}")
             return []
 
-    def get_course_contents(self, course_id: int) -> List[Section]:
+    def get_course_contents(self, course_id: int, parallel: bool = False, max_workers: int = 8) -> List[Section]:
+        """
+        :param parallel: Assemble the course from concurrent per-section fetches
+                         instead of downloading the whole course page at once.
+                         Only used on Moodle 4.0+ (with the course index); older
+                         sites always get the single full-page fetch. Section 0
+                         is then built from the course index state, so its
+                         summary is empty and its modules have no description;
+                         such a result is not cached, so it never replaces the
+                         full page for later calls.
+        """
         url = urljoin(self.session.base_url, f"course/view.php?id={course_id}")
+        cached = self._cached_page(f"course:{course_id}", url, parsers.parse_course_contents)
+        if cached is not None:
+            return cached
+
+        if parallel:
+            sections = self._get_course_contents_by_section(course_id, max_workers)
+            if sections is not None:
+                return sections
+            logger.info("Per-section fetch failed, falling back to the full course page")
+
         logger.info(f"Fetching course contents: {url}")
         try:
-            response = self.session.get(url)
-            response.raise_for_status()
-            return parsers.parse_course_contents(response.text)
+            return self._revalidated_page(f"course:{course_id}", url, parsers.parse_course_contents)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error fetching course contents: {e}")
             return []
 
+    def _get_course_contents_by_section(self, course_id: int, max_workers: int) -> Optional[List[Section]]:
+        # コースインデックスがない (4.0 未満の) サイトでは、セクションごとの取得は全体の取得より高くつく
+        state = self._get_course_state(course_id)
+        infos = parsers.parse_course_state(state) if state else []
+        if not infos:
+            return None
+
+        def fetch(info: SectionInfo) -> Optional[Section]:
+            # section=0 はコース全体を表示するので、状態に含まれるモジュール一覧から組み立てる
+            # (概要とモジュールの説明は状態に含まれないため空になる)
+            if info.number == 0:
+                return parsers.parse_course_state_section(state, 0)
+            return self.get_section_contents(course_id, info.number)
+
+        sections = utils.map_concurrently(fetch, infos, max_workers)
+        if any(section is None for section in sections):
+            return None
+        return sections
+
+    def _get_course_state(self, course_id: int) -> Optional[Dict]:
+        """Returns the course index state (core_courseformat_get_state, Moodle 4.0+), or None."""
+        try:
+            data = self.call_ajax("core_courseformat_get_state", {"courseid": course_id})
+            return json.loads(data) if isinstance(data, str) else data
+        except (MoodleRequestError, Exception) as e:
+            logger.info(f"Course index unavailable: {e}")
+            return None
+
+    def get_sesskey(self, refresh: bool = False) -> Optional[str]:
+        """Returns the session key (read once from the dashboard and cached)."""
+        if self._sesskey and not refresh:
+            return self._sesskey
+        try:
+            response = self.session.get(self.session.base_url)
+            response.raise_for_status()
+            self._sesskey = parsers.parse_sesskey(response.text)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching sesskey: {e}")
+        return self._sesskey
+
+    def call_ajax(self, methodname: str, args: Dict) -> Optional[object]:
+        """
+        Calls a Moodle AJAX web service function (lib/ajax/service.php) and returns its data.
+        Raises MoodleRequestError if the function reports an error.
+        """
+        for attempt in range(2):
+            sesskey = self.get_sesskey(refresh=attempt > 0)
+            if not sesskey:
+                raise MoodleRequestError("No sesskey available for AJAX call")
+            url = urljoin(self.session.base_url, f"lib/ajax/service.php?sesskey={sesskey}&info={methodname}")
+            response = self.session.post(url, json=[{"index": 0, "methodname": methodname, "args": args}])
+            response.raise_for_status()
+            result = response.json()
+            if isinstance(result, dict):
+                # リクエスト全体のエラー (セッション切れなど)
+                result = [result]
+            item = result[0]
+            if not item.get('error'):
+                return item.get('data')
+            exception = item.get('exception') or item
+            if exception.get('errorcode') == 'invalidsesskey' and attempt == 0:
+                continue
+            raise MoodleRequestError(f"{methodname} failed: {exception.get('message', exception)}")
+        return None
+
+    def get_course_sections(self, course_id: int) -> List[SectionInfo]:
+        """
+        Lists the sections of a course without their module details.
+
+        Uses the course index state (core_courseformat_get_state, Moodle 4.0+);
+        older sites fall back to parsing the full course page.
+        """
+        sections = parsers.parse_course_state(self._get_course_state(course_id) or {})
+        if sections:
+            return sections
+        logger.info("Listing sections from the course page")
+
+        infos = []
+        for position, section in enumerate(self.get_course_contents(course_id)):
+            # data-sectionid はほとんどのテーマでセクション番号
+            number = int(section.id) if section.id and section.id.isdigit() else position
+            infos.append(SectionInfo(
+                number=number,
+                id=None,
+                name=section.name,
+                url=urljoin(self.session.base_url, f"course/view.php?id={course_id}&section={number}"),
+                module_ids=[m.id for m in section.modules if m.id is not None]
+            ))
+        return infos
+
+    def get_section_contents(self, course_id: int, section: int) -> Optional[Section]:
+        """Fetches the modules of one section (course/view.php?id=X&section=N)."""
+        url = urljoin(self.session.base_url, f"course/view.php?id={course_id}&section={section}")
+        logger.info(f"Fetching section contents: {url}")
+        try:
+            return self._get_parsed(url, parsers.parse_single_section, section)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching section contents: {e}")
+            return None
+
+    def get_course_changes(self, course_id: int, previous: Optional[diff.CourseSnapshot] = None) -> Tuple[Optional[diff.CourseSnapshot], List[CourseChange]]:
+        """
+        Fetches a course page and compares it with a previous snapshot.
+
+        :param previous: The snapshot returned by the previous call (None for the first poll).
+        :return: The new snapshot (None on failure) and the change events since ``previous``.
+                 The first poll returns no events.
+        """
+        url = urljoin(self.session.base_url, f"course/view.php?id={course_id}")
+        logger.info(f"Fetching course snapshot: {url}")
+        try:
+            response = self.session.get(url)
+            response.raise_for_status()
+            snapshot = diff.take_snapshot(course_id, response.text, previous)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching course snapshot: {e}")
+            return None, []
+
+        if previous is None:
+            return snapshot, []
+        return snapshot, diff.diff_snapshots(previous, snapshot)
+
     def get_course_categories(self, category_id: Optional[int] = None) -> List[Category]:
         if category_id:
             target_url = urljoin(self.session.base_url, f"course/index.php?categoryid={category_id}")
@@ -53,14 +364,110 @@ class MoodleAPI:
             logger.error(f"Error fetching categories: {e}")
             return []
 
+    def get_category_tree(self, max_depth: Optional[int] = None, include_courses: bool = False,
+                          max_workers: int = 8, refresh: bool = False) -> List[CategoryNode]:
+        """
+        Crawls the category hierarchy breadth-first with concurrent requests.
+
+        :param max_depth: Number of levels to return (1 = root categories only). None for no limit.
+        :param include_courses: Also list the courses in each category.
+        :param max_workers: Maximum number of concurrent requests.
+        :param refresh: Ignore category pages cached by previous crawls.
+        :return: The root category nodes.
+        """
+        roots: List[CategoryNode] = []
+        seen = set()
+
+        def accept(category: Category, depth: int) -> Optional[CategoryNode]:
+            cat_id = self._category_id(category)
+            if cat_id is None or cat_id in seen:
+                return None
+            seen.add(cat_id)
+            return CategoryNode(category=category, depth=depth)
+
+        def needs_fetch(node: CategoryNode) -> bool:
+            expand = node.category.has_children and (max_depth is None or node.depth < max_depth)
+            return expand or (include_courses and node.category.course_count > 0)
+
+        for category in self.get_course_categories():
+            node = accept(category, depth=1)
+            if node:
+                roots.append(node)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            for node in roots:
+                if needs_fetch(node):
+                    future = executor.submit(self._fetch_category_level, node.category, include_courses, refresh)
+                    pending[future] = node
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = pending.pop(future)
+                    subcategories, courses = future.result()
+                    node.courses = courses
+                    if max_depth is not None and node.depth >= max_depth:
+                        continue
+                    for sub in subcategories:
+                        child = accept(sub, depth=node.depth + 1)
+                        if not child:
+                            continue
+                        node.children.append(child)
+                        if needs_fetch(child):
+                            child_future = executor.submit(self._fetch_category_level, child.category, include_courses, refresh)
+                            pending[child_future] = child
+
+        logger.info(f"Crawled {len(seen)} categories")
+        return roots
+
+    @staticmethod
+    def _category_id(category: Category) -> Optional[int]:
+        if category.id is not None:
+            return category.id
+        try:
+            return int(parse_qs(urlparse(category.url).query)['categoryid'][0])
+        except (ValueError, KeyError, IndexError):
+            return None
+
+    def _fetch_category_level(self, category: Category, include_courses: bool,
+                              refresh: bool = False) -> Tuple[List[Category], List[Course]]:
+        """Fetches the subcategories (and optionally courses) of one category, with caching."""
+        cat_id = self._category_id(category)
+        cache_key = (cat_id, include_courses)
+        if not refresh and cache_key in self._category_cache:
+            return self._category_cache[cache_key]
+
+        per_page = max(category.course_count, 1000)
+        subcategories: List[Category] = []
+        courses: List[Course] = []
+        try:
+            # browse=categories はサブカテゴリを全件表示し、サブカテゴリのないカテゴリではコースを全件表示する
+            url = urljoin(self.session.base_url, f"course/index.php?categoryid={cat_id}&browse=categories&perpage={per_page}")
+            logger.debug(f"Fetching category level: {url}")
+            response = self.session.get(url)
+            response.raise_for_status()
+            subcategories = parsers.parse_categories(response.text, is_subcategory=True)
+
+            if include_courses and category.course_count > 0:
+                courses = parsers.parse_category_courses(response.text)
+                if not courses:
+                    url = urljoin(self.session.base_url, f"course/index.php?categoryid={cat_id}&browse=courses&perpage={per_page}")
+                    response = self.session.get(url)
+                    response.raise_for_status()
+                    courses = parsers.parse_category_courses(response.text)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching category {cat_id}: {e}")
+            return subcategories, courses
+
+        self._category_cache[cache_key] = (subcategories, courses)
+        return subcategories, courses
+
     def get_resource_download_url(self, resource_id: int) -> Optional[str]:
         resource_url = urljoin(self.session.base_url, f"mod/resource/view.php?id={resource_id}")
         logger.debug(f"Resolving resource URL: {resource_url}")
         try:
-            response = self.session.get(resource_url, allow_redirects=False)
-            if response.status_code in (301, 302, 303):
-                return response.headers.get('Location')
-            return parsers.parse_resource_url(response.text)
+            return self._resolve_view_url(resource_url, parsers.parse_resource_url, ResourceLinkFinder)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error resolving resource URL: {e}")
             return None
@@ -69,21 +476,64 @@ class MoodleAPI:
         mod_url = urljoin(self.session.base_url, f"mod/url/view.php?id={url_id}")
         logger.debug(f"Resolving external URL: {mod_url}")
         try:
-            response = self.session.get(mod_url, allow_redirects=False)
-            if response.status_code in (301, 302, 303):
-                return response.headers.get('Location')
-            return parsers.parse_external_url(response.text)
+            return self._resolve_view_url(mod_url, parsers.parse_external_url)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error resolving external URL: {e}")
             return None
 
+    def _resolve_view_url(self, view_url: str, parse, finder_class=None,
+                          course_id: Optional[int] = None) -> Optional[str]:
+        """
+        Returns the redirect target of a module view page, or the link parsed from it.
+        With ``finder_class``, the page is streamed and reading stops once the link is found.
+
+        Raises MoodleRequestError when the page redirects to this site's login
+        page (expired session) or, if ``course_id`` is given, back to that
+        course's page (restricted module), so that the redirect is not
+        mistaken for the module's URL.
+        """
+        response = self.session.get(view_url, allow_redirects=False, stream=finder_class is not None)
+        # ストリーミング時は途中で例外になっても接続を返すよう必ず閉じる
+        with response:
+            if response.status_code in (301, 302, 303, 307, 308):
+                location = response.headers.get('Location')
+                if not location:
+                    return None
+                target = urljoin(view_url, location)
+                if self._is_fallback_redirect(target, course_id):
+                    raise MoodleRequestError(f"{view_url} redirected to {target}")
+                return target
+            response.raise_for_status()
+
+            if finder_class is None:
+                url = parse(response.text)
+            else:
+                finder = finder_class()
+                text = scan_response(response, finder)
+                # 見つからなかった場合はページ全体を読み終えているので、通常のパーサーで再確認する
+                url = finder.url if text is None else parse(text)
+            return urljoin(view_url, url) if url else None
+
+    def _is_fallback_redirect(self, url: str, course_id: Optional[int] = None) -> bool:
+        """
+        True for this site's login page, or for the page of ``course_id``
+        (where Moodle sends users away from a module they cannot access).
+        Links to other courses are legitimate URL module targets.
+        """
+        if not url.startswith(self.session.base_url):
+            return False
+        parsed = urlparse(url)
+        if '/login/' in parsed.path:
+            return True
+        if course_id is None or not parsed.path.endswith('/course/view.php'):
+            return False
+        return parse_qs(parsed.query).get('id') == [str(course_id)]
+
     def get_folder_details(self, folder_id: int) -> Optional[FolderDetails]:
         folder_url = urljoin(self.session.base_url, f"mod/folder/view.php?id={folder_id}")
         logger.info(f"Fetching folder details: {folder_url}")
         try:
-            response = self.session.get(folder_url)
-            response.raise_for_status()
-            return parsers.parse_folder(response.text)
+            return self._get_parsed(folder_url, parsers.parse_folder)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error fetching folder details: {e}")
             return None
@@ -92,31 +542,142 @@ class MoodleAPI:
         assign_url = urljoin(self.session.base_url, f"mod/assign/view.php?id={assign_id}")
         logger.info(f"Fetching assignment details: {assign_url}")
         try:
-            response = self.session.get(assign_url)
-            response.raise_for_status()
-            return parsers.parse_assignment(response.text)
+            return self._get_parsed(assign_url, parsers.parse_assignment)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error fetching assignment details: {e}")
             return None
 
+    def get_all_assignments(self, courses: Optional[List[Course]] = None, max_workers: int = 8,
+                            tz: Optional[tzinfo] = None) -> List[AssignmentDeadline]:
+        """
+        Collects the assignments of all courses, fetched in parallel, sorted by due date.
+
+        Assignments that are already graded are fetched once and served from
+        memory afterwards.
+
+        :param courses: Courses to scan (defaults to get_my_courses()).
+        :param tz: Timezone of the dates shown by Moodle (defaults to the local timezone).
+        :return: Deadlines sorted by due date; assignments without a due date come last.
+        """
+        if courses is None:
+            courses = self.get_my_courses()
+        all_sections = utils.map_concurrently(lambda c: self.get_course_contents(c.id), courses, max_workers)
+
+        targets: List[Tuple[Course, Module]] = []
+        for course, sections in zip(courses, all_sections):
+            for section in sections:
+                targets.extend((course, m) for m in section.modules if m.type == 'assign' and m.id is not None)
+
+        def fetch(target: Tuple[Course, Module]) -> Optional[AssignmentDetails]:
+            module_id = target[1].id
+            if module_id in self._final_assignments:
+                return self._final_assignments[module_id]
+            details = self.get_assignment_details(module_id)
+            if details and details.grading_status.strip() in ("評定済み", "Graded"):
+                self._final_assignments[module_id] = details
+            return details
+
+        deadlines: List[AssignmentDeadline] = []
+        for (course, module), details in zip(targets, utils.map_concurrently(fetch, targets, max_workers)):
+            if details is None:
+                continue
+            deadlines.append(AssignmentDeadline(
+                course=course,
+                module=module,
+                details=details,
+                due_at=utils.parse_moodle_datetime(details.due_date, tz),
+                time_remaining=utils.parse_moodle_duration(details.time_remaining)
+            ))
+
+        deadlines.sort(key=lambda d: (d.due_at is None, d.due_at.timestamp() if d.due_at else 0))
+        return deadlines
+
     def get_forum_details(self, forum_id: int) -> Optional[ForumDetails]:
         forum_url = urljoin(self.session.base_url, f"mod/forum/view.php?id={forum_id}")
         logger.info(f"Fetching forum details: {forum_url}")
         try:
-            response = self.session.get(forum_url)
-            response.raise_for_status()
-            return parsers.parse_forum(response.text)
+            return self._get_parsed(forum_url, parsers.parse_forum)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error fetching forum details: {e}")
             return None
 
+    def iter_forum_discussions(self, forum_id: int, perpage: int = 1000) -> Iterator[ForumDiscussion]:
+        """
+        Streams every discussion of a forum, one list page at a time.
+
+        Pages are followed through the paging bar's next link, because the
+        page size is a site setting (forum_manydiscussions) and the paging
+        parameters differ between versions. ``perpage`` is sent as a hint for
+        sites that honour it. Paging stops on an empty page or one that only
+        repeats discussions already seen.
+        """
+        url = urljoin(self.session.base_url, f"mod/forum/view.php?id={forum_id}&perpage={perpage}")
+        seen = set()
+        visited = set()
+        while url and url not in visited:
+            visited.add(url)
+            logger.info(f"Fetching forum discussions: {url}")
+            try:
+                response = self.session.get(url)
+                response.raise_for_status()
+                discussions, next_url = parsers.parse_forum_discussions_page(response.text)
+            except (MoodleRequestError, Exception) as e:
+                logger.error(f"Error fetching forum discussions: {e}")
+                return
+
+            new = [d for d in discussions if d.id not in seen]
+            if not new:
+                return
+            for discussion in new:
+                seen.add(discussion.id)
+                yield discussion
+            url = urljoin(url, next_url) if next_url else None
+
+    def get_forum_discussion_posts(self, discussion_id: int) -> List[ForumPost]:
+        url = urljoin(self.session.base_url, f"mod/forum/discuss.php?d={discussion_id}")
+        logger.info(f"Fetching forum discussion: {url}")
+        try:
+            response = self.session.get(url)
+            response.raise_for_status()
+            return parsers.parse_forum_posts(response.text, discussion_id)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching forum discussion: {e}")
+            return []
+
+    def crawl_forum(self, forum_id: int, since: Optional[Dict[int, str]] = None, perpage: int = 1000,
+                    max_workers: int = 8) -> Iterator[Tuple[ForumDiscussion, List[ForumPost]]]:
+        """
+        Streams (discussion, posts) pairs for a whole forum.
+
+        Discussion threads are fetched concurrently while the discussion list is
+        still being paged through; results are yielded as they complete.
+
+        :param since: Incremental mode. A mapping of discussion id to the
+                      ``ForumDiscussion.change_key`` seen in a previous run;
+                      discussions whose last post did not change are skipped.
+        """
+        since = since or {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            for discussion in self.iter_forum_discussions(forum_id, perpage):
+                if since.get(discussion.id) == discussion.change_key:
+                    continue
+                pending[executor.submit(self.get_forum_discussion_posts, discussion.id)] = discussion
+
+                # 未処理のスレッドが溜まりすぎないように、完了したものから返す
+                if len(pending) >= max_workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+
+            for future in as_completed(list(pending)):
+                yield pending.pop(future), future.result()
+
     def get_page_details(self, page_id: int) -> Optional[PageDetails]:
         page_url = urljoin(self.session.base_url, f"mod/page/view.php?id={page_id}")
         logger.info(f"Fetching page details: {page_url}")
         try:
-            response = self.session.get(page_url)
-            response.raise_for_status()
-            return parsers.parse_page(response.text)
+            return self._get_parsed(page_url, parsers.parse_page)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error fetching page details: {e}")
             return None
@@ -125,33 +686,286 @@ class MoodleAPI:
         quiz_url = urljoin(self.session.base_url, f"mod/quiz/view.php?id={quiz_id}")
         logger.info(f"Fetching quiz details: {quiz_url}")
         try:
-            response = self.session.get(quiz_url)
-            response.raise_for_status()
-            return parsers.parse_quiz(response.text)
+            return self._get_parsed(quiz_url, parsers.parse_quiz)
         except (MoodleRequestError, Exception) as e:
             logger.error(f"Error fetching quiz details: {e}")
             return None
 
-    def download_file(self, url: str, save_path: str) -> Optional[str]:
+    def get_quiz_start_params(self, quiz_id: int) -> Optional[Tuple[int, str]]:
         """
-        Downloads a file and saves it to the specified path.
+        Returns (cmid, sesskey) for start_quiz_attempt, or None if no attempt can be started.
+        Only reads the quiz page up to the start form, unlike get_quiz_details.
         """
-        logger.info(f"Downloading file from: {url}")
+        quiz_url = urljoin(self.session.base_url, f"mod/quiz/view.php?id={quiz_id}")
+        logger.info(f"Fetching quiz start form: {quiz_url}")
         try:
-            response = self.session.get(url, stream=True)
+            with self.session.get(quiz_url, stream=True) as response:
+                response.raise_for_status()
+                finder = QuizStartFinder()
+                scan_response(response, finder)
+            if not finder.found or not finder.sesskey:
+                return None
+            return (finder.cmid if finder.cmid is not None else quiz_id), finder.sesskey
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching quiz start form: {e}")
+            return None
+
+    def get_quiz_review(self, review_url: str) -> Optional[QuizReview]:
+        """
+        Fetches and parses a quiz review page (all questions on one page).
+        Reviews of finished attempts are cached and never requested again.
+        """
+        cache_key = self._review_cache_key(review_url)
+        if cache_key in self._review_cache:
+            return self._review_cache[cache_key]
+
+        parsed = urlparse(urljoin(self.session.base_url, review_url))
+        params = dict(parse_qsl(parsed.query))
+        params['showall'] = '1'
+        url = parsed._replace(query=urlencode(params)).geturl()
+        logger.info(f"Fetching quiz review: {url}")
+        try:
+            response = self.session.get(url)
             response.raise_for_status()
+            review = parsers.parse_quiz_review(response.text)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching quiz review: {e}")
+            return None
+
+        review.review_url = review_url
+        if review.attempt_id is None:
+            review.attempt_id = params.get('attempt')
+        if self._is_finished_review(review):
+            self._review_cache[cache_key] = review
+        return review
+
+    @staticmethod
+    def _review_cache_key(review_url: str) -> str:
+        params = dict(parse_qsl(urlparse(review_url).query))
+        return params.get('attempt', review_url)
+
+    @staticmethod
+    def _is_finished_review(review: QuizReview) -> bool:
+        for header, value in review.summary.items():
+            if "状態" in header or "State" in header:
+                return "終了" in value or "Finished" in value
+        return False
+
+    def get_quiz_reviews(self, quiz_id: int, max_workers: int = 8) -> List[QuizReview]:
+        """Fetches the reviews of every attempt of a quiz in parallel."""
+        details = self.get_quiz_details(quiz_id)
+        if not details:
+            return []
+        urls = [a.review_url for a in details.attempts if a.review_url]
+        reviews = utils.map_concurrently(self.get_quiz_review, urls, max_workers)
+        return [r for r in reviews if r is not None]
+
+    def get_all_quiz_reviews(self, course_id: int, max_workers: int = 8) -> Dict[int, List[QuizReview]]:
+        """
+        Fetches the reviews of every attempt of every quiz in a course.
+        :return: A mapping of quiz module id to its reviews.
+        """
+        quiz_ids = [m.id for s in self.get_course_contents(course_id) for m in s.modules
+                    if m.type == 'quiz' and m.id is not None]
+        all_details = utils.map_concurrently(self.get_quiz_details, quiz_ids, max_workers)
+
+        jobs = []
+        for quiz_id, details in zip(quiz_ids, all_details):
+            if details:
+                jobs.extend((quiz_id, a.review_url) for a in details.attempts if a.review_url)
+        reviews = utils.map_concurrently(lambda job: self.get_quiz_review(job[1]), jobs, max_workers)
+
+        result: Dict[int, List[QuizReview]] = {quiz_id: [] for quiz_id in quiz_ids}
+        for (quiz_id, _), review in zip(jobs, reviews):
+            if review is not None:
+                result[quiz_id].append(review)
+        return result
+
+    def get_grades_overview(self, max_age: Optional[float] = None) -> List[CourseGrade]:
+        """
+        Returns the grade of every enrolled course from the overview report,
+        in one request. The result is cached and revalidated with a conditional
+        request; within ``max_age`` seconds no request is made.
+        """
+        url = urljoin(self.session.base_url, "grade/report/overview/index.php")
+        logger.info(f"Fetching grades overview: {url}")
+        try:
+            return self._revalidated_page('grades', url, parsers.parse_grades_overview, max_age)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching grades overview: {e}")
+            return []
+
+    def get_course_grades(self, course_id: int, max_age: Optional[float] = None) -> List[GradeItem]:
+        """Returns the grade items of one course from its user report (cached like get_grades_overview)."""
+        url = urljoin(self.session.base_url, f"grade/report/user/index.php?id={course_id}")
+        logger.info(f"Fetching course grades: {url}")
+        try:
+            return self._revalidated_page(f"grades:{course_id}", url, parsers.parse_user_grade_report, max_age)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching course grades: {e}")
+            return []
+
+    def get_all_course_grades(self, course_ids: Optional[List[int]] = None, max_workers: int = 8,
+                              max_age: Optional[float] = None) -> Dict[int, List[GradeItem]]:
+        """
+        Fetches the user reports of many courses in parallel.
+        :param course_ids: Defaults to the courses listed in get_grades_overview().
+        :return: A mapping of course id to its grade items.
+        """
+        if course_ids is None:
+            course_ids = [g.course_id for g in self.get_grades_overview(max_age) if g.course_id is not None]
+        reports = utils.map_concurrently(lambda c: self.get_course_grades(c, max_age), course_ids, max_workers)
+        return dict(zip(course_ids, reports))
+
+    def hydrate_course(self, course_id: int, types: Optional[Tuple[str, ...]] = None,
+                       max_workers: int = 8, refresh: bool = False,
+                       max_age: Optional[float] = 3600) -> Optional[HydratedCourse]:
+        """
+        Fetches the course contents and the details of every module in parallel.
+
+        Each module is dispatched by type to its detail parser (assignment, quiz,
+        folder, page, forum), and resources / URLs are resolved to ResolvedURL.
+        A module that fails gets an ``error`` instead of ``details``; the others
+        are unaffected.
+
+        Details are cached while the module is unchanged on the course page
+        (url, name or description) and ``refresh`` is not set. Resolved
+        resources / URLs are reused as long as that holds. Detail pages are
+        reused for ``max_age`` seconds after they were last checked and then
+        revalidated with conditional requests (None revalidates every time).
+        Redirects to the login page or back to this course are never cached.
+
+        :param types: Module types to hydrate (defaults to HYDRATE_TYPES).
+        """
+        sections = self.get_course_contents(course_id)
+        if not sections:
+            return None
+        types = tuple(types) if types is not None else self.HYDRATE_TYPES
+        unsupported = set(types) - set(self.HYDRATE_TYPES)
+        if unsupported:
+            raise ValueError(f"Unsupported module types: {sorted(unsupported)}")
+
+        modules = [m for section in sections for m in section.modules
+                   if m.type in types and m.id is not None]
+        hydrated = utils.map_concurrently(lambda m: self._hydrate_module(m, course_id, refresh, max_age),
+                                          modules, max_workers)
+        return HydratedCourse(
+            course_id=course_id,
+            sections=sections,
+            modules={m.id: h for m, h in zip(modules, hydrated)},
+        )
+
+    def _hydrate_module(self, module: Module, course_id: int, refresh: bool,
+                        max_age: Optional[float]) -> HydratedModule:
+        try:
+            details = self._flights.do(('hydrate', module.type, module.id),
+                                       lambda: self._fetch_module_details(module, course_id, refresh, max_age))
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error hydrating {module.type} {module.id}: {e}")
+            return HydratedModule(module=module, error=str(e))
+        if details is None:
+            return HydratedModule(module=module, error="No details found")
+        return HydratedModule(module=module, details=details)
 
-            filename = utils.extract_filename_from_response(response, url)
+    def _fetch_module_details(self, module: Module, course_id: int, refresh: bool, max_age: Optional[float]):
+        module_type, module_id = module.type, module.id
+        key = (module_type, module_id)
+        # ファイルの差し替えや URL の変更はコースページ上の表示 (名前・説明・サイズなど) にも現れる
+        fingerprint = (module.url, module.name, module.description)
+        with self._cache_lock:
+            cached = self._module_details.get(key)
+        if cached is not None and (refresh or cached[2] != fingerprint):
+            cached = None
 
-            # save_path logic
-            if os.path.isdir(save_path):
-                file_path = os.path.join(save_path, filename)
+        if module_type in ('resource', 'url'):
+            # 解決済みの URL はコースページ上のモジュールが変わらない限り再取得しない
+            if cached is not None:
+                return cached[0]
+            view_url = urljoin(self.session.base_url, f"mod/{module_type}/view.php?id={module_id}")
+            if module_type == 'resource':
+                url = self._resolve_view_url(view_url, parsers.parse_resource_url, ResourceLinkFinder, course_id)
             else:
-                file_path = save_path
+                url = self._resolve_view_url(view_url, parsers.parse_external_url, course_id=course_id)
+            if not url:
+                return None
+            if self._is_fallback_redirect(url, course_id):
+                raise MoodleRequestError(f"{view_url} points to {url}")
+            details = ResolvedURL(kind=module_type, module_id=module_id, url=url,
+                                  revision=resource_revision(url) if module_type == 'resource' else None)
+            validator = None
+        else:
+            # 詳細ページには ETag がないことが多いので、max_age の間は再検証しない
+            if cached is not None and max_age is not None and time.time() - cached[3] < max_age:
+                return cached[0]
+            path, parse = self.DETAIL_PAGES[module_type]
+            url = urljoin(self.session.base_url, f"{path}?id={module_id}")
+            logger.info(f"Fetching {module_type} details: {url}")
+            response, validator = self.session.conditional_get(url, cached[1] if cached else None)
+            if response is None:
+                details = cached[0]
+            else:
+                self._check_session(response)
+                details = parse(response.text, profile=self.site_profile(response.text))
+
+        with self._cache_lock:
+            self._module_details[key] = (details, validator, fingerprint, time.time())
+        return details
+
+    def download_file(self, url: str, save_path: str,
+                      progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                      throttle: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        """
+        Downloads a file and saves it to the specified path.
+
+        The body is read straight into a reused buffer, the file is preallocated
+        from Content-Length, and progress(downloaded, total) is called at most
+        twice a second (total is None when the size is unknown). throttle(n) is
+        called after every block of n bytes and may sleep to cap bandwidth.
+
+        When a ContentStore is configured, the content is stored once by hash and
+        linked into save_path. pluginfile.php URLs that were already fetched are
+        served from the store without a request.
+        """
+        try:
+            if self.store:
+                entry = self.store.lookup(url)
+                if entry:
+                    file_path = self._resolve_save_path(save_path, entry.filename)
+                    self.store.link(entry.digest, file_path)
+                    logger.info(f"File linked from store: {file_path}")
+                    return file_path
+
+            logger.info(f"Downloading file from: {url}")
+            with self.session.get(url, stream=True) as response:
+                response.raise_for_status()
+
+                filename = utils.extract_filename_from_response(response, url)
+                file_path = self._resolve_save_path(save_path, filename)
 
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+                # gzip などの Content-Encoding は urllib3 側で展開させる
+                response.raw.decode_content = True
+                size = utils.response_content_length(response)
+
+                if self.store:
+                    digest = self.store.ingest_reader(response.raw.readinto, size=size, progress=progress, throttle=throttle)
+                    self.store.remember(url, StoreEntry(
+                        digest=digest,
+                        filename=filename,
+                        size=os.path.getsize(self.store.object_path(digest))
+                    ))
+                    self.store.link(digest, file_path)
+                else:
+                    # 一時ファイルに書き込み、最後まで受信できた場合だけ置き換える
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.',
+                                                    prefix=f".{os.path.basename(file_path)}.", suffix='.part')
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            utils.copy_readinto(response.raw.readinto, f, size=size, progress=progress, throttle=throttle)
+                        os.replace(tmp_path, file_path)
+                    except BaseException:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                        raise
 
             logger.info(f"File saved to: {file_path}")
             return file_path
@@ -160,6 +974,13 @@ class MoodleAPI:
             logger.error(f"Error downloading file: {e}")
             return None
 
+    @staticmethod
+    def _resolve_save_path(save_path: str, filename: str) -> str:
+        # save_path logic
+        if os.path.isdir(save_path):
+            return os.path.join(save_path, filename)
+        return save_path
+
     def start_quiz_attempt(self, cmid: int, sesskey: str) -> Optional[str]:
         """
         Starts a new quiz attempt.
@@ -215,14 +1036,37 @@ class MoodleAPI:
         :return: The URL of the next page (e.g., summary or next question page) or None on failure.
         """
         url = urljoin(self.session.base_url, "mod/quiz/processattempt.php")
+        payload = self._quiz_attempt_payload(attempt_data, answers)
 
+        if finish_attempt:
+            payload['nextpage'] = '-1'
+            payload['next'] = 'テストを終了する ...' # This text might vary by language!
+            # Moodle often checks the presence of the button name.
+            # 'finishattempt' might be safer if it exists as a hidden field, but usually it's a submit button.
+            # In English it's 'Finish attempt ...'. In Japanese 'テストを終了する ...'.
+            # Safer to include 'next' with some value.
+        else:
+            payload['next'] = 'Next'
+
+        logger.info(f"Submitting quiz answers for attempt {attempt_data.attempt_id}")
+        try:
+            response = self.session.post(url, data=payload)
+            response.raise_for_status()
+            logger.info(f"Submission successful. Redirected to: {response.url}")
+            return response.url
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error submitting quiz answers: {e}")
+            return None
+
+    def _quiz_attempt_payload(self, attempt_data: QuizAttemptData, answers: Dict[str, str]) -> Dict[str, str]:
+        """Builds the processattempt.php form data for the page in attempt_data."""
         # Basic payload required by Moodle
         payload = {
             'attempt': attempt_data.attempt_id,
             'sesskey': attempt_data.sesskey,
             'slots': attempt_data.slots,
-            'thispage': '0', # Assuming single page or first page for now. Ideally should be parsed.
-            'nextpage': '-1', # -1 usually means finish or next.
+            'thispage': str(attempt_data.this_page),
+            'nextpage': str(attempt_data.next_page), # -1 means the last page (next goes to the summary).
             'timeup': '0',
             'scrollpos': '',
         }
@@ -267,44 +1111,73 @@ class MoodleAPI:
                 payload[f'{prefix}_:sequencecheck'] = q.sequencecheck
                 payload[f'{prefix}_:flagged'] = '0' # Default to not flagged
 
-        if finish_attempt:
-            payload['next'] = 'テストを終了する ...' # This text might vary by language!
-            # Moodle often checks the presence of the button name.
-            # 'finishattempt' might be safer if it exists as a hidden field, but usually it's a submit button.
-            # In English it's 'Finish attempt ...'. In Japanese 'テストを終了する ...'.
-            # Safer to include 'next' with some value.
-        else:
-            payload['next'] = 'Next'
+        return payload
 
-        logger.info(f"Submitting quiz answers for attempt {attempt_data.attempt_id}")
+    def navigate_quiz_attempt(self, attempt_data: QuizAttemptData, answers: Dict[str, str], page: int) -> Tuple[Optional[str], Optional[QuizAttemptData]]:
+        """
+        Saves the answers on the current page and moves to another page in one POST.
+
+        The redirected attempt page is parsed directly, so no extra GET is needed.
+
+        :param page: The page to go to, or -1 for the summary page.
+        :return: The URL after the redirect and the parsed page (None when the
+                 redirect went to the summary page or on failure).
+        """
+        url = urljoin(self.session.base_url, "mod/quiz/processattempt.php")
+        payload = self._quiz_attempt_payload(attempt_data, answers)
+        payload['nextpage'] = str(page)
+        payload['next'] = '1'
+
+        logger.info(f"Saving page {attempt_data.this_page} of attempt {attempt_data.attempt_id}, going to page {page}")
         try:
             response = self.session.post(url, data=payload)
             response.raise_for_status()
-            logger.info(f"Submission successful. Redirected to: {response.url}")
-            return response.url
+            if "attempt.php" in response.url:
+                return response.url, parsers.parse_quiz_attempt(response.text)
+            return response.url, None
         except (MoodleRequestError, Exception) as e:
-            logger.error(f"Error submitting quiz answers: {e}")
-            return None
+            logger.error(f"Error navigating quiz attempt: {e}")
+            return None, None
 
-    def finish_quiz_attempt(self, attempt_id: str, sesskey: str, cmid: str) -> Optional[str]:
+    def get_quiz_summary(self, summary_url: str) -> Dict[str, str]:
+        """
+        Fetches the attempt summary page.
+        :return: A mapping of question number to its status (e.g. '回答保存済み').
+        """
+        logger.info(f"Fetching quiz attempt summary: {summary_url}")
+        try:
+            response = self.session.get(summary_url)
+            response.raise_for_status()
+            return parsers.parse_quiz_summary(response.text)
+        except (MoodleRequestError, Exception) as e:
+            logger.error(f"Error fetching quiz summary: {e}")
+            return {}
+
+    def finish_quiz_attempt(self, attempt_id: str, sesskey: str, cmid: str,
+                            attempt_data: Optional[QuizAttemptData] = None, answers: Optional[Dict[str, str]] = None) -> Optional[str]:
         """
         Finalizes the quiz attempt (equivalent to clicking "Submit all and finish").
 
         :param attempt_id: The attempt ID.
         :param sesskey: The session key.
         :param cmid: The course module ID (quiz ID).
+        :param attempt_data: If given, the answers for this page are saved in the same request.
+        :param answers: Answers for the page in attempt_data.
         :return: The URL of the review page or None on failure.
         """
         url = urljoin(self.session.base_url, "mod/quiz/processattempt.php")
 
-        payload = {
+        payload = {}
+        if attempt_data is not None:
+            payload.update(self._quiz_attempt_payload(attempt_data, answers or {}))
+        payload.update({
             'attempt': attempt_id,
             'finishattempt': '1',
             'timeup': '0',
-            'slots': '',
             'cmid': cmid,
             'sesskey': sesskey
-        }
+        })
+        payload.setdefault('slots', '')
 
         logger.info(f"Finishing quiz attempt {attempt_id} (cmid={cmid})")
         try:
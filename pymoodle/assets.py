@@ -0,0 +1,195 @@
+import os
+import re
+import html
+import json
+import tempfile
+import logging
+import threading
+from concurrent.futures import Future
+from urllib.parse import urljoin, unquote, quote
+from typing import Dict, Iterable, List, Optional
+
+from pymoodle import utils
+from pymoodle.store import pluginfile_key
+
+logger = logging.getLogger(__name__)
+
+# src="..." / href="..." / data="..." / poster="..." のうち pluginfile.php を指すもの
+_ASSET_ATTR_RE = re.compile(
+    r'''(?P<attr>\b(?:src|href|data|poster)\s*=\s*)(?P<quote>["'])(?P<url>[^"']*?pluginfile\.php[^"']*)(?P=quote)''',
+    re.IGNORECASE
+)
+_UNSAFE_PATH_CHARS_RE = re.compile(r'[<>:"\\|?*\x00-\x1f]')
+
+def find_pluginfile_urls(html_text: str, base_url: Optional[str] = None) -> List[str]:
+    """
+    Returns the unique pluginfile.php URLs referenced by src/href attributes in an HTML fragment,
+    in document order. Relative URLs are resolved against base_url.
+    """
+    urls = []
+    seen = set()
+    for match in _ASSET_ATTR_RE.finditer(html_text):
+        url = _absolute_url(match.group('url'), base_url)
+        if url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+def _absolute_url(raw: str, base_url: Optional[str]) -> str:
+    url = html.unescape(raw).strip()
+    return urljoin(base_url, url) if base_url else url
+
+def asset_relative_path(url: str) -> Optional[str]:
+    """
+    Local path (relative to the asset directory) for a pluginfile.php URL:
+    contextid/component/filearea/itemid/.../filename
+    """
+    key = pluginfile_key(url)
+    if key is None:
+        return None
+    parts = []
+    for part in key.split('/')[1:]:  # 先頭はホスト名
+        part = _UNSAFE_PATH_CHARS_RE.sub('_', unquote(part))
+        if part in ('', '.', '..'):
+            part = '_'
+        parts.append(part)
+    return os.path.join(*parts)
+
+class AssetHarvester:
+    """
+    Downloads the pluginfile.php assets (images, embedded files) referenced by
+    page contents and intros, and rewrites the HTML to point at the local copies.
+
+    Assets are saved under ``directory`` by their pluginfile.php path, so each
+    file is fetched once across pages and runs. Completed downloads are
+    recorded in ``.assets.json``; a file on disk that is not recorded there
+    (for example left by an interrupted run) is downloaded again. Concurrent
+    requests for the same asset share a single download. If the API has a
+    ContentStore, files are deduplicated by content as well.
+    """
+
+    MANIFEST = ".assets.json"
+
+    def __init__(self, api, directory: str, max_workers: int = 8):
+        self.api = api
+        self.directory = directory
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._assets: Dict[str, Future] = {}
+        self._manifest_path = os.path.join(directory, self.MANIFEST)
+        self._completed = self._load_manifest()
+
+    def _load_manifest(self) -> set:
+        if not os.path.exists(self._manifest_path):
+            return set()
+        try:
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                return set(json.load(f))
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Failed to load asset manifest: {e}")
+            return set()
+
+    def _save_manifest(self):
+        with self._lock:
+            data = sorted(self._completed)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._manifest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def local_path(self, url: str) -> Optional[str]:
+        relative = asset_relative_path(url)
+        if relative is None:
+            return None
+        return os.path.join(self.directory, relative)
+
+    def fetch(self, urls: Iterable[str]) -> Dict[str, str]:
+        """
+        Downloads the given asset URLs in parallel (skipping ones already downloaded).
+        Returns {url: local path} for the assets that are available.
+        """
+        owned: List[str] = []
+        futures: Dict[str, Future] = {}
+        with self._lock:
+            for url in urls:
+                if url in futures or self.local_path(url) is None:
+                    continue
+                future = self._assets.get(url)
+                if future is None:
+                    future = Future()
+                    self._assets[url] = future
+                    owned.append(url)
+                futures[url] = future
+
+        if owned:
+            utils.map_concurrently(self._download, owned, self.max_workers)
+            self._save_manifest()
+
+        result = {}
+        for url, future in futures.items():
+            path = future.result()
+            if path:
+                result[url] = path
+        return result
+
+    def _download(self, url: str):
+        future = self._assets[url]
+        path = self.local_path(url)
+        try:
+            with self._lock:
+                complete = url in self._completed
+            if not (complete and os.path.exists(path)):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                path = self.api.download_file(url, path)
+                if path:
+                    with self._lock:
+                        self._completed.add(url)
+            future.set_result(path)
+        except Exception as e:
+            logger.error(f"Error downloading asset {url}: {e}")
+            future.set_result(None)
+
+        if future.result() is None:
+            # 失敗したものは次回の呼び出しで再試行する
+            with self._lock:
+                self._assets.pop(url, None)
+
+    def localize(self, html_text: str, base_url: Optional[str] = None,
+                 relative_to: Optional[str] = None) -> str:
+        """
+        Downloads the assets referenced by an HTML fragment and returns the HTML
+        with those references rewritten to local paths.
+
+        :param base_url: Used to resolve relative references (defaults to the site URL).
+        :param relative_to: Directory the HTML will be saved in; paths are written
+                            relative to it. Absolute paths are used if omitted.
+        """
+        return self.localize_many([html_text], base_url, relative_to)[0]
+
+    def localize_many(self, html_texts: List[str], base_url: Optional[str] = None,
+                      relative_to: Optional[str] = None) -> List[str]:
+        """Like localize(), but downloads the assets of all fragments in a single parallel batch."""
+        if base_url is None:
+            base_url = self.api.session.base_url
+
+        urls = []
+        for html_text in html_texts:
+            urls.extend(find_pluginfile_urls(html_text, base_url))
+        local = self.fetch(urls)
+
+        def replace(match):
+            path = local.get(_absolute_url(match.group('url'), base_url))
+            if path is None:
+                return match.group(0)
+            if relative_to is not None:
+                path = os.path.relpath(path, relative_to)
+            path = quote(path.replace(os.sep, '/'))
+            return f"{match.group('attr')}{match.group('quote')}{path}{match.group('quote')}"
+
+        return [_ASSET_ATTR_RE.sub(replace, html_text) for html_text in html_texts]
@@ -1,19 +1,32 @@
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Tuple, Iterator
+from datetime import tzinfo
+import os
+import pickle
 import logging
 from pymoodle.session import MoodleSession
 from pymoodle.api import MoodleAPI
-from pymoodle.types import Course, Category, Section, FolderDetails, AssignmentDetails, ForumDetails, PageDetails, QuizDetails, QuizAttemptData
+from pymoodle.store import ContentStore
+from pymoodle.diff import CourseSnapshot
+from pymoodle.quiz import QuizAttemptNavigator
+from pymoodle.types import Course, Category, CategoryNode, CourseChange, Section, SectionInfo, FolderDetails, AssignmentDetails, AssignmentDeadline, ForumDetails, ForumDiscussion, ForumPost, PageDetails, QuizDetails, QuizAttemptData, QuizReview, HydratedCourse, CourseGrade, GradeItem
 
 logger = logging.getLogger(__name__)
 
+STATE_VERSION = 1
+
 class MoodleClient:
     """
     High-level client for Moodle.
     Acts as a facade for MoodleSession and MoodleAPI.
     """
-    def __init__(self, base_url: Optional[str], session_file="session.json"):
+    def __init__(self, base_url: Optional[str], session_file="session.json", store_dir: Optional[str] = None):
+        """
+        :param store_dir: If given, downloads go through a content-addressable store
+                          in this directory (deduplicated across courses).
+        """
         self.session = MoodleSession(base_url=base_url, session_file=session_file)
-        self.api = MoodleAPI(self.session)
+        store = ContentStore(store_dir) if store_dir else None
+        self.api = MoodleAPI(self.session, store=store)
 
     def login(self, username, password) -> bool:
         """
@@ -33,11 +46,73 @@ class MoodleClient:
         """Checks if logged in."""
         return self.session.is_logged_in()
 
+    def save_state(self, path: str = "state.pickle"):
+        """
+        Saves the cookies, sesskey, course list and parsed course trees (with
+        their validators) so a new process can start without refetching them.
+
+        The file contains session cookies; keep it private.
+        """
+        state = {
+            'version': STATE_VERSION,
+            'base_url': self.session.base_url,
+            'cookies': self.session.session.cookies,
+            'api': self.api.get_cache_state(),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.info(f"State saved to {path}")
+
+    def load_state(self, path: str = "state.pickle") -> bool:
+        """
+        Restores a state saved by save_state (only load files you created).
+
+        The restored course list and course trees are returned immediately by
+        get_my_courses / get_course_contents and revalidated in the background
+        (conditional requests where the server supports them).
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IOError) as e:
+            logger.error(f"Failed to load state file: {e}")
+            return False
+
+        if state.get('version') != STATE_VERSION or state.get('base_url') != self.session.base_url:
+            logger.warning(f"Ignoring state file {path} (different version or site)")
+            return False
+
+        self.session.session.cookies.update(state['cookies'])
+        self.api.restore_cache_state(state['api'])
+        logger.info(f"State loaded from {path}")
+        return True
+
+    def wait_for_revalidation(self, timeout: Optional[float] = None):
+        """Waits for the background revalidation started after load_state."""
+        self.api.wait_for_revalidation(timeout)
+
+    def coalescing_stats(self) -> Dict[str, Dict[str, int]]:
+        """Counts of coalesced requests ('requests') and shared parse results ('pages')."""
+        return {'requests': self.session.coalescing_stats(), 'pages': self.api._flights.stats()}
+
     def get_my_courses(self) -> List[Course]:
         return self.api.get_my_courses()
 
-    def get_course_contents(self, course_id: int) -> List[Section]:
-        return self.api.get_course_contents(course_id)
+    def get_course_contents(self, course_id: int, parallel: bool = False, max_workers: int = 8) -> List[Section]:
+        return self.api.get_course_contents(course_id, parallel, max_workers)
+
+    def get_course_sections(self, course_id: int) -> List[SectionInfo]:
+        return self.api.get_course_sections(course_id)
+
+    def get_section_contents(self, course_id: int, section: int) -> Optional[Section]:
+        return self.api.get_section_contents(course_id, section)
+
+    def get_course_changes(self, course_id: int, previous: Optional[CourseSnapshot] = None) -> Tuple[Optional[CourseSnapshot], List[CourseChange]]:
+        return self.api.get_course_changes(course_id, previous)
 
     def get_resource_download_url(self, resource_id: int) -> Optional[str]:
         return self.api.get_resource_download_url(resource_id)
@@ -51,21 +126,68 @@ class MoodleClient:
     def get_assignment_details(self, assign_id: int) -> Optional[AssignmentDetails]:
         return self.api.get_assignment_details(assign_id)
 
+    def get_all_assignments(self, courses: Optional[List[Course]] = None, max_workers: int = 8,
+                            tz: Optional[tzinfo] = None) -> List[AssignmentDeadline]:
+        return self.api.get_all_assignments(courses, max_workers, tz)
+
     def get_forum_details(self, forum_id: int) -> Optional[ForumDetails]:
         return self.api.get_forum_details(forum_id)
 
+    def iter_forum_discussions(self, forum_id: int, perpage: int = 1000) -> Iterator[ForumDiscussion]:
+        return self.api.iter_forum_discussions(forum_id, perpage)
+
+    def get_forum_discussion_posts(self, discussion_id: int) -> List[ForumPost]:
+        return self.api.get_forum_discussion_posts(discussion_id)
+
+    def crawl_forum(self, forum_id: int, since: Optional[Dict[int, str]] = None, perpage: int = 1000,
+                    max_workers: int = 8) -> Iterator[Tuple[ForumDiscussion, List[ForumPost]]]:
+        return self.api.crawl_forum(forum_id, since, perpage, max_workers)
+
     def get_page_details(self, page_id: int) -> Optional[PageDetails]:
         return self.api.get_page_details(page_id)
 
     def get_quiz_details(self, quiz_id: int) -> Optional[QuizDetails]:
         return self.api.get_quiz_details(quiz_id)
 
-    def download_file(self, url: str, save_path: str) -> Optional[str]:
-        return self.api.download_file(url, save_path)
+    def get_quiz_start_params(self, quiz_id: int) -> Optional[Tuple[int, str]]:
+        return self.api.get_quiz_start_params(quiz_id)
+
+    def get_quiz_review(self, review_url: str) -> Optional[QuizReview]:
+        return self.api.get_quiz_review(review_url)
+
+    def get_quiz_reviews(self, quiz_id: int, max_workers: int = 8) -> List[QuizReview]:
+        return self.api.get_quiz_reviews(quiz_id, max_workers)
+
+    def get_all_quiz_reviews(self, course_id: int, max_workers: int = 8) -> Dict[int, List[QuizReview]]:
+        return self.api.get_all_quiz_reviews(course_id, max_workers)
+
+    def get_grades_overview(self, max_age: Optional[float] = None) -> List[CourseGrade]:
+        return self.api.get_grades_overview(max_age)
+
+    def get_course_grades(self, course_id: int, max_age: Optional[float] = None) -> List[GradeItem]:
+        return self.api.get_course_grades(course_id, max_age)
+
+    def get_all_course_grades(self, course_ids: Optional[List[int]] = None, max_workers: int = 8,
+                              max_age: Optional[float] = None) -> Dict[int, List[GradeItem]]:
+        return self.api.get_all_course_grades(course_ids, max_workers, max_age)
+
+    def hydrate_course(self, course_id: int, types: Optional[Tuple[str, ...]] = None,
+                       max_workers: int = 8, refresh: bool = False,
+                       max_age: Optional[float] = 3600) -> Optional[HydratedCourse]:
+        return self.api.hydrate_course(course_id, types, max_workers, refresh, max_age)
+
+    def download_file(self, url: str, save_path: str,
+                      progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                      throttle: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        return self.api.download_file(url, save_path, progress, throttle)
 
     def get_course_categories(self, category_id: Optional[int] = None) -> List[Category]:
         return self.api.get_course_categories(category_id)
 
+    def get_category_tree(self, max_depth: Optional[int] = None, include_courses: bool = False,
+                          max_workers: int = 8, refresh: bool = False) -> List[CategoryNode]:
+        return self.api.get_category_tree(max_depth, include_courses, max_workers, refresh)
+
     def start_quiz_attempt(self, cmid: int, sesskey: str) -> Optional[str]:
         return self.api.start_quiz_attempt(cmid, sesskey)
 
@@ -75,5 +197,9 @@ class MoodleClient:
     def submit_quiz_answers(self, attempt_data: QuizAttemptData, answers: Dict[str, str], finish_attempt: bool = False) -> Optional[str]:
         return self.api.submit_quiz_answers(attempt_data, answers, finish_attempt)
 
-    def finish_quiz_attempt(self, attempt_id: str, sesskey: str, cmid: str) -> Optional[str]:
-        return self.api.finish_quiz_attempt(attempt_id, sesskey, cmid)
+    def open_quiz_attempt(self, attempt_url: str, cmid: Optional[int] = None) -> Optional[QuizAttemptNavigator]:
+        return QuizAttemptNavigator.open(self.api, attempt_url, cmid)
+
+    def finish_quiz_attempt(self, attempt_id: str, sesskey: str, cmid: str,
+                            attempt_data: Optional[QuizAttemptData] = None, answers: Optional[Dict[str, str]] = None) -> Optional[str]:
+        return self.api.finish_quiz_attempt(attempt_id, sesskey, cmid, attempt_data, answers)
@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymoodle import parsers
+from pymoodle.types import CrawlSummary
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (status, next_attempt);
+"""
+
+# モジュールの種類 -> (詳細ページのパス, パーサー)
+_DETAIL_PAGES = {
+    'assign': ("mod/assign/view.php?id={}", parsers.parse_assignment),
+    'folder': ("mod/folder/view.php?id={}", parsers.parse_folder),
+    'forum': ("mod/forum/view.php?id={}", parsers.parse_forum),
+    'page': ("mod/page/view.php?id={}", parsers.parse_page),
+    'quiz': ("mod/quiz/view.php?id={}", parsers.parse_quiz),
+}
+
+class CrawlError(Exception):
+    """Raised by a task that should be retried."""
+
+class CrawlJob:
+    """
+    Resumable full-site mirror backed by a SQLite work queue.
+
+    The queue holds one item per course, module and file. Each item is
+    checkpointed as soon as it finishes, together with the items it discovered,
+    so a crashed or interrupted job continues where it stopped when run again
+    with the same database. Failed items are retried with exponential backoff
+    and marked failed after ``max_attempts``.
+
+    Output layout (under ``output_dir``)::
+
+        courses.json
+        <course_id>/course.json
+        <course_id>/<module_id>/details.json   (assign, folder, forum, page, quiz)
+        <course_id>/<module_id>/<filename>     (downloaded files)
+    """
+
+    def __init__(self, api, db_path: str, output_dir: str, max_workers: int = 4,
+                 max_attempts: int = 5, retry_delay: float = 30.0, max_retry_delay: float = 3600.0,
+                 download_files: bool = True):
+        self.api = api
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.download_files = download_files
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def close(self):
+        self._conn.close()
+
+    # --- queue ---
+
+    def enqueue(self, kind: str, key: str, payload: Dict[str, Any]):
+        """Adds an item unless an item with the same key already exists (done or not)."""
+        self._enqueue_many([(kind, key, payload)])
+
+    def _enqueue_many(self, items: List[Tuple[str, str, Dict[str, Any]]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (key, kind, payload, updated) VALUES (?, ?, ?, ?)",
+                [(key, kind, json.dumps(payload, ensure_ascii=False), time.time()) for kind, key, payload in items]
+            )
+
+    def _recover(self):
+        # 前回の実行中に中断されたものを未処理に戻す
+        with self._lock:
+            cur = self._conn.execute("UPDATE tasks SET status = 'pending' WHERE status = 'running'")
+        if cur.rowcount:
+            logger.info(f"Requeued {cur.rowcount} interrupted items")
+
+    def _claim(self, limit: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT key, kind, payload FROM tasks WHERE status = 'pending' AND next_attempt <= ? "
+                    "ORDER BY next_attempt, rowid LIMIT ?", (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE tasks SET status = 'running', updated = ? WHERE key = ?", [(now, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(key, kind, json.loads(payload)) for key, kind, payload in rows]
+
+    def _complete(self, key: str, discovered: List[Tuple[str, str, Dict[str, Any]]]):
+        """Marks an item done and enqueues what it discovered, in one transaction (the checkpoint)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tasks (key, kind, payload, updated) VALUES (?, ?, ?, ?)",
+                    [(k, kind, json.dumps(payload, ensure_ascii=False), time.time()) for kind, k, payload in discovered]
+                )
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'done', last_error = NULL, updated = ? WHERE key = ?", (time.time(), key)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _fail(self, key: str, error: str):
+        with self._lock:
+            attempts = self._conn.execute("SELECT attempts FROM tasks WHERE key = ?", (key,)).fetchone()[0] + 1
+            if attempts >= self.max_attempts:
+                status, next_attempt = 'failed', 0
+                logger.error(f"Giving up on {key} after {attempts} attempts: {error}")
+            else:
+                delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+                status, next_attempt = 'pending', time.time() + delay * random.uniform(0.8, 1.2)
+                logger.warning(f"{key} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, attempts = ?, next_attempt = ?, last_error = ?, updated = ? WHERE key = ?",
+                (status, attempts, next_attempt, error, time.time(), key)
+            )
+
+    def retry_failed(self):
+        """Puts items that exhausted their attempts back into the queue."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = 'pending', attempts = 0, next_attempt = 0 WHERE status = 'failed'"
+            )
+
+    def _next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt) FROM tasks WHERE status IN ('pending', 'running')"
+            ).fetchone()
+        return row[0]
+
+    # --- running ---
+
+    def run(self, courses: Optional[List[int]] = None, stop: Optional[threading.Event] = None) -> CrawlSummary:
+        """
+        Runs (or resumes) the crawl until the queue is drained or ``stop`` is set.
+
+        :param courses: Course ids to mirror. Defaults to all enrolled courses.
+                        Only used when the queue is first seeded.
+        """
+        started = time.monotonic()
+        self._recover()
+        if courses is None:
+            self.enqueue('courses', 'courses', {})
+        else:
+            self._enqueue_many([('course', f"course:{course_id}", {'course_id': course_id}) for course_id in courses])
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not (stop and stop.is_set()):
+                free = self.max_workers - len(running)
+                if free > 0:
+                    for key, kind, payload in self._claim(free):
+                        running[executor.submit(self._run_task, kind, payload)] = key
+
+                if not running:
+                    next_due = self._next_due()
+                    if next_due is None:
+                        break
+                    # バックオフ中のものしか残っていない
+                    delay = max(0.0, next_due - time.time())
+                    if stop:
+                        stop.wait(delay)
+                    else:
+                        time.sleep(delay)
+                    continue
+
+                done, _ = wait(list(running), timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        self._complete(key, future.result())
+                    except Exception as e:
+                        self._fail(key, f"{type(e).__name__}: {e}")
+
+            # 停止要求時は実行中のものを待ってから記録する
+            for future, key in running.items():
+                try:
+                    self._complete(key, future.result())
+                except Exception as e:
+                    self._fail(key, f"{type(e).__name__}: {e}")
+
+        summary = self.summary(time.monotonic() - started)
+        logger.info(f"Crawl {'finished' if summary.finished else 'stopped'}: {summary.counts}")
+        return summary
+
+    def summary(self, elapsed: float = 0.0) -> CrawlSummary:
+        with self._lock:
+            counts: Dict[str, Dict[str, int]] = {}
+            for kind, status, count in self._conn.execute(
+                    "SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status"):
+                counts.setdefault(kind, {})[status] = count
+            failed = [
+                {'key': key, 'kind': kind, 'attempts': attempts, 'error': error}
+                for key, kind, attempts, error in self._conn.execute(
+                    "SELECT key, kind, attempts, last_error FROM tasks WHERE status = 'failed' ORDER BY key")
+            ]
+        finished = not any(statuses.get('pending') or statuses.get('running') for statuses in counts.values())
+        return CrawlSummary(counts=counts, failed=failed, elapsed=elapsed, finished=finished)
+
+    # --- tasks ---
+
+    def _run_task(self, kind: str, payload: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        handler = getattr(self, f"_task_{kind}")
+        return handler(**payload)
+
+    def _page(self, path: str, parse):
+        # get_* は失敗時に None / [] を返すため、再試行できるよう例外を送出する get_parsed_page を使う
+        # (セッション切れでログインページに飛ばされた場合も get_parsed_page が例外にする)
+        result = self.api.get_parsed_page(path, parse)
+        if result is None:
+            # 詳細ページのパーサーは読み取れなかったときに None を返す。空のリスト (コースのないダッシュボードなど) は正常
+            raise CrawlError(f"Nothing parsed from {path or 'the dashboard'}")
+        return result
+
+    def _write_json(self, relative_path: str, data: Any):
+        path = os.path.join(self.output_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _task_courses(self):
+        courses = self._page("", parsers.parse_my_courses)
+        self._write_json("courses.json", [asdict(course) for course in courses])
+        return [('course', f"course:{course.id}", {'course_id': course.id}) for course in courses]
+
+    def _task_course(self, course_id: int):
+        sections = self._page(f"course/view.php?id={course_id}", parsers.parse_course_contents)
+        self._write_json(os.path.join(str(course_id), "course.json"), [asdict(section) for section in sections])
+        discovered = []
+        for section in sections:
+            for module in section.modules:
+                if module.id is not None and (module.type in _DETAIL_PAGES or module.type == 'resource'):
+                    discovered.append(('module', f"module:{module.id}",
+                                       {'course_id': course_id, 'module_id': module.id, 'module_type': module.type}))
+        return discovered
+
+    def _task_module(self, course_id: int, module_id: int, module_type: str):
+        module_dir = os.path.join(str(course_id), str(module_id))
+        if module_type == 'resource':
+            url = self.api.get_resource_download_url(module_id)
+            if not url:
+                raise CrawlError(f"Could not resolve resource {module_id}")
+            return self._file_items(course_id, module_id, [url])
+
+        path, parse = _DETAIL_PAGES[module_type]
+        details = self._page(path.format(module_id), parse)
+        data = asdict(details)
+        # 受験データは大きく、ミラーには不要
+        data.pop('latest_attempt_data', None)
+        self._write_json(os.path.join(module_dir, "details.json"), data)
+
+        urls = []
+        if module_type == 'folder':
+            urls = [item.url for item in details.files]
+        elif module_type == 'assign':
+            urls = [item.url for item in details.attachments + details.submission_files]
+        return self._file_items(course_id, module_id, urls)
+
+    def _file_items(self, course_id: int, module_id: int, urls: List[str]):
+        if not self.download_files:
+            return []
+        return [('file', f"file:{module_id}:{hashlib.sha1(url.encode('utf-8')).hexdigest()}",
+                 {'course_id': course_id, 'module_id': module_id, 'url': url}) for url in urls if url]
+
+    def _task_file(self, course_id: int, module_id: int, url: str):
+        directory = os.path.join(self.output_dir, str(course_id), str(module_id))
+        os.makedirs(directory, exist_ok=True)
+        if not self.api.download_file(url, directory):
+            raise CrawlError(f"Download failed: {url}")
+        return []
@@ -0,0 +1,191 @@
+import re
+import gzip
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from pymoodle import parsers
+from pymoodle.types import (
+    Module, CourseChange, ModuleAdded, ModuleRemoved, ModuleRenamed, ModuleMoved,
+    CompletionChanged, DescriptionChanged
+)
+
+# セクションの開始タグ (<li id="section-3" class="section main" ...>)
+_SECTION_START_RE = re.compile(r'<li\b[^>]*\sid=["\']section-\d+["\'][^>]*>', re.IGNORECASE)
+_LI_TAG_RE = re.compile(r'<(/?)li\b', re.IGNORECASE)
+
+@dataclass
+class ModuleRecord:
+    id: int
+    type: str
+    name: str
+    completed: bool
+    description_hash: str
+
+@dataclass
+class SectionSnapshot:
+    id: Optional[str]
+    fingerprint: str
+    modules: List[ModuleRecord]
+
+@dataclass
+class CourseSnapshot:
+    """
+    Compact state of a course page used to detect changes between polls.
+
+    Each section keeps a fingerprint of its raw HTML, so sections whose markup
+    did not change are neither parsed nor compared on the next poll.
+    """
+    course_id: int
+    sections: List[SectionSnapshot]
+    # 今回パースしたモジュール (永続化はしない)
+    parsed_modules: Dict[int, Module] = field(default_factory=dict, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        return {
+            'c': self.course_id,
+            's': [
+                [s.id, s.fingerprint, [[m.id, m.type, m.name, int(m.completed), m.description_hash] for m in s.modules]]
+                for s in self.sections
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'CourseSnapshot':
+        return cls(
+            course_id=data['c'],
+            sections=[
+                SectionSnapshot(
+                    id=section_id,
+                    fingerprint=fingerprint,
+                    modules=[ModuleRecord(id=m[0], type=m[1], name=m[2], completed=bool(m[3]), description_hash=m[4]) for m in modules]
+                )
+                for section_id, fingerprint, modules in data['s']
+            ]
+        )
+
+def _digest(text: str, size: int) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=size).hexdigest()
+
+def _element_end(html: str, start: int) -> int:
+    """Returns the end offset of the <li> element starting at ``start``."""
+    depth = 0
+    for match in _LI_TAG_RE.finditer(html, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            end = html.find('>', match.end())
+            return len(html) if end == -1 else end + 1
+    return len(html)
+
+def split_sections(html: str) -> List[str]:
+    """Cuts the raw HTML of each course section out of a course page."""
+    return [html[m.start():_element_end(html, m.start())] for m in _SECTION_START_RE.finditer(html)]
+
+def _record(module: Module) -> ModuleRecord:
+    return ModuleRecord(
+        id=module.id,
+        type=module.type,
+        name=module.name,
+        completed=module.completed,
+        description_hash=_digest(module.description or "", 8)
+    )
+
+def take_snapshot(course_id: int, html: str, previous: Optional[CourseSnapshot] = None) -> CourseSnapshot:
+    """
+    Builds a snapshot of a course page.
+    Sections whose HTML fingerprint matches ``previous`` are reused without parsing.
+    """
+    known: Dict[str, SectionSnapshot] = {}
+    if previous:
+        known = {s.fingerprint: s for s in previous.sections}
+
+    snapshot = CourseSnapshot(course_id=course_id, sections=[])
+    fragments = split_sections(html)
+
+    if not fragments:
+        # セクションの開始タグが見つからないレイアウトではページ全体をパースする
+        for section in parsers.parse_course_contents(html):
+            snapshot.sections.append(_section_snapshot(snapshot, section, _digest(repr(section), 16)))
+        return snapshot
+
+    for fragment in fragments:
+        fingerprint = _digest(fragment, 16)
+        if fingerprint in known:
+            snapshot.sections.append(known[fingerprint])
+            continue
+        section = parsers.parse_section_fragment(fragment)
+        if section is not None:
+            snapshot.sections.append(_section_snapshot(snapshot, section, fingerprint))
+    return snapshot
+
+def _section_snapshot(snapshot: CourseSnapshot, section, fingerprint: str) -> SectionSnapshot:
+    records = []
+    for module in section.modules:
+        if module.id is None:
+            continue
+        snapshot.parsed_modules[module.id] = module
+        records.append(_record(module))
+    return SectionSnapshot(id=section.id, fingerprint=fingerprint, modules=records)
+
+def diff_snapshots(old: CourseSnapshot, new: CourseSnapshot) -> List[CourseChange]:
+    """
+    Returns the change events between two snapshots of the same course.
+
+    Only sections whose fingerprint changed are compared, so the cost is linear
+    in the size of the changed sections. Reordering within a section is not
+    reported; moving a module to another section is.
+    """
+    course_id = new.course_id
+    old_prints = {s.fingerprint for s in old.sections}
+    new_prints = {s.fingerprint for s in new.sections}
+
+    before: Dict[int, Tuple[Optional[str], ModuleRecord]] = {}
+    for section in old.sections:
+        if section.fingerprint not in new_prints:
+            for record in section.modules:
+                before[record.id] = (section.id, record)
+
+    after: Dict[int, Tuple[Optional[str], ModuleRecord]] = {}
+    for section in new.sections:
+        if section.fingerprint not in old_prints:
+            for record in section.modules:
+                after[record.id] = (section.id, record)
+
+    events: List[CourseChange] = []
+    for module_id, (section_id, record) in after.items():
+        if module_id not in before:
+            module = new.parsed_modules.get(module_id) or Module(
+                id=record.id, type=record.type, name=record.name,
+                url=None, description=None, completed=record.completed
+            )
+            events.append(ModuleAdded(course_id=course_id, module_id=module_id, section_id=section_id, module=module))
+            continue
+
+        old_section_id, old_record = before[module_id]
+        if old_record.name != record.name:
+            events.append(ModuleRenamed(course_id=course_id, module_id=module_id, old_name=old_record.name, new_name=record.name))
+        if old_section_id != section_id:
+            events.append(ModuleMoved(course_id=course_id, module_id=module_id, old_section_id=old_section_id, new_section_id=section_id))
+        if old_record.completed != record.completed:
+            events.append(CompletionChanged(course_id=course_id, module_id=module_id, completed=record.completed))
+        if old_record.description_hash != record.description_hash:
+            module = new.parsed_modules.get(module_id)
+            events.append(DescriptionChanged(course_id=course_id, module_id=module_id, description=module.description if module else None))
+
+    for module_id, (section_id, record) in before.items():
+        if module_id not in after:
+            events.append(ModuleRemoved(course_id=course_id, module_id=module_id, section_id=section_id, name=record.name))
+
+    return events
+
+def save_snapshots(path: str, snapshots: Dict[int, CourseSnapshot]):
+    """Saves snapshots of many courses to a gzip-compressed JSON file."""
+    data = [snapshot.to_dict() for snapshot in snapshots.values()]
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+def load_snapshots(path: str) -> Dict[int, CourseSnapshot]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    return {item['c']: CourseSnapshot.from_dict(item) for item in data}
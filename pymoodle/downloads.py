@@ -0,0 +1,257 @@
+import time
+import heapq
+import logging
+import threading
+import itertools
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, List, Optional, Tuple
+
+from pymoodle.types import DownloadStats
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Limits a byte rate. ``consume(n)`` takes n tokens and sleeps while the
+    bucket is in debt, so blocks larger than the burst size still work.
+    The bucket starts empty, so a new transfer does not begin with a burst.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: int):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+class DownloadJob:
+    """A queued download. ``future`` resolves to the saved path, or None on failure."""
+
+    def __init__(self, url: str, save_path: str, priority: int, size_hint: Optional[int],
+                 max_rate: Optional[float]):
+        self.url = url
+        self.save_path = save_path
+        self.priority = priority
+        self.size_hint = size_hint
+        self.max_rate = max_rate
+        self.future: Future = Future()
+        self.bytes_done = 0
+        self.total: Optional[int] = size_hint  # Content-Length が分かったら置き換える
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def remaining(self) -> Optional[int]:
+        if self.total is None:
+            return None
+        return max(self.total - self.bytes_done, 0)
+
+class DownloadScheduler:
+    """
+    Runs ``download_file`` jobs in parallel, in a chosen order and under a
+    bandwidth cap.
+
+    Jobs with a higher ``priority`` run first. Among equal priorities, smaller
+    ``size_hint`` runs first (with ``order='size'``, the default), so many
+    small handouts are not held up by one large video; jobs without a size
+    hint go last. With ``order='fifo'`` jobs of equal priority run in the
+    order they were added.
+
+    ``bandwidth_limit`` caps the total rate in bytes per second, and
+    ``max_rate`` on a job caps that job alone. ``stats()`` reports queue
+    depth, recent throughput and an ETA.
+    """
+
+    ORDERS = ('size', 'fifo')
+
+    def __init__(self, api, max_parallel: int = 4, bandwidth_limit: Optional[float] = None,
+                 order: str = 'size', throughput_window: float = 5.0):
+        if order not in self.ORDERS:
+            raise ValueError(f"order must be one of {self.ORDERS}")
+        self.api = api
+        self.max_parallel = max_parallel
+        self.order = order
+        self.throughput_window = throughput_window
+        self._bucket = TokenBucket(bandwidth_limit) if bandwidth_limit else None
+        self._heap: List[Tuple[tuple, DownloadJob]] = []
+        self._seq = itertools.count()
+        self._active: List[DownloadJob] = []
+        self._completed = 0
+        self._failed = 0
+        self._bytes_done = 0
+        self._samples: Deque[Tuple[float, int]] = deque()
+        self._first_start: Optional[float] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"moodle-download-{i}", daemon=True)
+            for i in range(max_parallel)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def add(self, url: str, save_path: str, priority: int = 0, size_hint: Optional[int] = None,
+            max_rate: Optional[float] = None) -> DownloadJob:
+        """
+        Queues a download.
+
+        :param priority: Higher runs first.
+        :param size_hint: Expected size in bytes (for example from the course
+                          page), used for ordering and the ETA.
+        :param max_rate: Per-job cap in bytes per second.
+        """
+        job = DownloadJob(url, save_path, priority, size_hint, max_rate)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("DownloadScheduler is closed")
+            heapq.heappush(self._heap, (self._sort_key(job), job))
+            self._cond.notify_all()
+        return job
+
+    def _sort_key(self, job: DownloadJob) -> tuple:
+        seq = next(self._seq)
+        if self.order == 'fifo':
+            return (-job.priority, seq)
+        size = job.size_hint if job.size_hint is not None else float('inf')
+        return (-job.priority, size, seq)
+
+    def set_bandwidth_limit(self, bandwidth_limit: Optional[float]):
+        """Changes the global cap (None removes it). Applies to running jobs too."""
+        self._bucket = TokenBucket(bandwidth_limit) if bandwidth_limit else None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, job = heapq.heappop(self._heap)
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                job.started_at = time.monotonic()
+                if self._first_start is None:
+                    self._first_start = job.started_at
+                self._active.append(job)
+            self._run(job)
+
+    def _run(self, job: DownloadJob):
+        job_bucket = TokenBucket(job.max_rate) if job.max_rate else None
+
+        def progress(done: int, total: Optional[int]):
+            if total is not None:
+                job.total = total
+
+        def throttle(n: int):
+            now = time.monotonic()
+            with self._cond:
+                job.bytes_done += n
+                self._bytes_done += n
+                self._samples.append((now, n))
+                self._prune_samples(now)
+            bucket = self._bucket
+            if bucket is not None:
+                bucket.consume(n)
+            if job_bucket is not None:
+                job_bucket.consume(n)
+
+        path = None
+        error = None
+        try:
+            path = self.api.download_file(job.url, job.save_path, progress=progress, throttle=throttle)
+        except Exception as e:
+            logger.error(f"Download failed for {job.url}: {e}")
+            error = e
+        with self._cond:
+            self._active.remove(job)
+            job.finished_at = time.monotonic()
+            if path is None:
+                self._failed += 1
+            else:
+                self._completed += 1
+            self._cond.notify_all()
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(path)
+
+    def _prune_samples(self, now: float):
+        # スループットの計算に使うウィンドウより古いサンプルは捨てる (呼び出し側がロックを持つ)
+        while self._samples and self._samples[0][0] < now - self.throughput_window:
+            self._samples.popleft()
+
+    def stats(self) -> DownloadStats:
+        """Returns queue depth, throughput over the last few seconds and an ETA."""
+        now = time.monotonic()
+        with self._cond:
+            self._prune_samples(now)
+            window = self.throughput_window
+            if self._first_start is not None:
+                # 開始直後はウィンドウ全体で割ると過小評価になる
+                window = min(window, now - self._first_start)
+            window = max(window, 1e-3)
+            throughput = sum(n for _, n in self._samples) / window
+
+            remaining: Optional[int] = 0
+            for job in self._active + [job for _, job in self._heap]:
+                if job.remaining is None:
+                    remaining = None
+                    break
+                remaining += job.remaining
+
+            eta = None
+            if remaining == 0:
+                eta = 0.0
+            elif remaining is not None and throughput > 0:
+                eta = remaining / throughput
+            return DownloadStats(
+                queued=len(self._heap),
+                active=len(self._active),
+                completed=self._completed,
+                failed=self._failed,
+                bytes_done=self._bytes_done,
+                bytes_remaining=remaining,
+                throughput=throughput,
+                eta=eta,
+            )
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every queued job has finished. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._heap or self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, wait: bool = True, cancel_pending: bool = False):
+        """Stops the workers. With cancel_pending, queued jobs are cancelled."""
+        with self._cond:
+            self._closed = True
+            if cancel_pending:
+                for _, job in self._heap:
+                    job.future.cancel()
+                self._heap.clear()
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,213 @@
+import os
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymoodle import utils
+from pymoodle.types import Course, Module
+
+logger = logging.getLogger(__name__)
+
+# レコードの種類ごとの列と型 (Arrow / Parquet のスキーマに使う)
+SCHEMAS: Dict[str, List[Tuple[str, str]]] = {
+    'course': [('id', 'int64'), ('name', 'string'), ('url', 'string'), ('image_url', 'string'),
+               ('teachers', 'list<string>')],
+    'section': [('course_id', 'int64'), ('id', 'string'), ('position', 'int32'), ('name', 'string'),
+                ('summary', 'string')],
+    'module': [('id', 'int64'), ('course_id', 'int64'), ('section_id', 'string'), ('position', 'int32'),
+               ('type', 'string'), ('name', 'string'), ('url', 'string'), ('description', 'string'),
+               ('completed', 'bool')],
+    'file': [('course_id', 'int64'), ('module_id', 'int64'), ('source', 'string'), ('filename', 'string'),
+             ('url', 'string'), ('mimetype', 'string')],
+    'assignment': [('module_id', 'int64'), ('course_id', 'int64'), ('title', 'string'),
+                   ('submission_status', 'string'), ('grading_status', 'string'), ('due_date', 'string'),
+                   ('due_at', 'timestamp'), ('time_remaining_seconds', 'float64'), ('last_modified', 'string')],
+    'quiz': [('module_id', 'int64'), ('course_id', 'int64'), ('title', 'string'), ('can_attempt', 'bool'),
+             ('attempt_count', 'int32'), ('last_state', 'string'), ('last_grade', 'string')],
+}
+
+Record = Tuple[str, Dict[str, Any]]
+
+def iter_site_records(api, courses: Optional[List[Course]] = None, details: bool = True,
+                      max_workers: int = 8) -> Iterator[Record]:
+    """
+    Crawls courses and yields flat (record_type, row) pairs as they are fetched.
+
+    Only one course tree is held in memory at a time. With ``details``, folder,
+    assignment and quiz pages are fetched (concurrently within a course) to
+    produce file, assignment and quiz records.
+    """
+    if courses is None:
+        courses = api.get_my_courses()
+
+    for course in courses:
+        yield 'course', {'id': course.id, 'name': course.name, 'url': course.url,
+                         'image_url': course.image_url, 'teachers': list(course.teachers)}
+
+        sections = api.get_course_contents(course.id)
+        modules: List[Module] = []
+        for s_pos, section in enumerate(sections):
+            yield 'section', {'course_id': course.id, 'id': section.id, 'position': s_pos,
+                              'name': section.name, 'summary': section.summary}
+            for m_pos, module in enumerate(section.modules):
+                modules.append(module)
+                yield 'module', {'id': module.id, 'course_id': course.id, 'section_id': section.id,
+                                 'position': m_pos, 'type': module.type, 'name': module.name, 'url': module.url,
+                                 'description': module.description, 'completed': module.completed}
+
+        if not details:
+            continue
+
+        targets = [m for m in modules if m.id is not None and m.type in ('folder', 'assign', 'quiz')]
+        results = utils.map_concurrently(lambda m: list(_detail_records(api, course.id, m)), targets, max_workers)
+        for records in results:
+            yield from records
+
+def _detail_records(api, course_id: int, module: Module) -> Iterator[Record]:
+    if module.type == 'folder':
+        folder = api.get_folder_details(module.id)
+        for item in (folder.files if folder else []):
+            yield 'file', _file_row(course_id, module.id, 'folder', item)
+
+    elif module.type == 'assign':
+        assignment = api.get_assignment_details(module.id)
+        if not assignment:
+            return
+        due_at = utils.parse_moodle_datetime(assignment.due_date)
+        remaining = utils.parse_moodle_duration(assignment.time_remaining)
+        yield 'assignment', {
+            'module_id': module.id, 'course_id': course_id, 'title': assignment.title,
+            'submission_status': assignment.submission_status, 'grading_status': assignment.grading_status,
+            'due_date': assignment.due_date,
+            'due_at': due_at.astimezone(timezone.utc) if due_at else None,
+            'time_remaining_seconds': remaining.total_seconds() if remaining is not None else None,
+            'last_modified': assignment.last_modified
+        }
+        for item in assignment.attachments:
+            yield 'file', _file_row(course_id, module.id, 'assignment_attachment', item)
+        for item in assignment.submission_files:
+            yield 'file', _file_row(course_id, module.id, 'submission', item)
+
+    elif module.type == 'quiz':
+        quiz = api.get_quiz_details(module.id)
+        if not quiz:
+            return
+        last = quiz.attempts[-1] if quiz.attempts else None
+        yield 'quiz', {
+            'module_id': module.id, 'course_id': course_id, 'title': quiz.title,
+            'can_attempt': quiz.can_attempt, 'attempt_count': len(quiz.attempts),
+            'last_state': last.state if last else None, 'last_grade': last.grade if last else None
+        }
+
+def _file_row(course_id: int, module_id: int, source: str, item) -> Dict[str, Any]:
+    return {'course_id': course_id, 'module_id': module_id, 'source': source,
+            'filename': item.filename, 'url': item.url, 'mimetype': item.mimetype}
+
+class JsonlWriter:
+    """Writes records as JSON lines, one object per line with a ``record_type`` field."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record_type: str, row: Dict[str, Any]):
+        data = {'record_type': record_type}
+        for key, value in row.items():
+            data[key] = value.isoformat() if isinstance(value, datetime) else value
+        self._file.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ArrowWriter:
+    """
+    Writes one columnar file per record type (``course.parquet``, ``module.parquet``, ...).
+
+    Rows are buffered per type and flushed as record batches of ``batch_size``
+    rows, so memory stays bounded regardless of the size of the site.
+    Requires pyarrow (``pip install pymoodle[arrow]``).
+
+    :param format: 'parquet' or 'arrow' (Arrow IPC file).
+    """
+
+    def __init__(self, directory: str, format: str = "parquet", batch_size: int = 10000):
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError("ArrowWriter requires pyarrow (pip install pyarrow)") from e
+        if format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown format: {format}")
+
+        self._pa = pyarrow
+        self.directory = directory
+        self.format = format
+        self.batch_size = batch_size
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._writers: Dict[str, Any] = {}
+        self._schemas = {name: self._schema(columns) for name, columns in SCHEMAS.items()}
+        os.makedirs(directory, exist_ok=True)
+
+    def _schema(self, columns: List[Tuple[str, str]]):
+        pa = self._pa
+        types = {
+            'int32': pa.int32(), 'int64': pa.int64(), 'float64': pa.float64(), 'bool': pa.bool_(),
+            'string': pa.string(), 'list<string>': pa.list_(pa.string()), 'timestamp': pa.timestamp('s', tz='UTC'),
+        }
+        return pa.schema([(name, types[type_name]) for name, type_name in columns])
+
+    def write(self, record_type: str, row: Dict[str, Any]):
+        buffer = self._buffers.setdefault(record_type, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self._flush(record_type)
+
+    def _flush(self, record_type: str):
+        rows = self._buffers.get(record_type)
+        if not rows:
+            return
+        schema = self._schemas[record_type]
+        batch = self._pa.RecordBatch.from_pylist(rows, schema=schema)
+        writer = self._writers.get(record_type)
+        if writer is None:
+            path = os.path.join(self.directory, f"{record_type}.{self.format}")
+            if self.format == "parquet":
+                import pyarrow.parquet as pq
+                writer = pq.ParquetWriter(path, schema)
+            else:
+                writer = self._pa.ipc.new_file(path, schema)
+            self._writers[record_type] = writer
+        writer.write_batch(batch)
+        self._buffers[record_type] = []
+
+    def close(self):
+        for record_type in list(self._buffers):
+            self._flush(record_type)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def export_site(api, writer, courses: Optional[List[Course]] = None, details: bool = True,
+                max_workers: int = 8) -> Dict[str, int]:
+    """
+    Streams a crawl of the site into a writer (JsonlWriter or ArrowWriter).
+    Returns the number of records written per type.
+    """
+    counts: Dict[str, int] = {}
+    for record_type, row in iter_site_records(api, courses, details, max_workers):
+        writer.write(record_type, row)
+        counts[record_type] = counts.get(record_type, 0) + 1
+    logger.info(f"Exported {sum(counts.values())} records: {counts}")
+    return counts
@@ -0,0 +1,401 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from pymoodle.types import (
+    Course, Section, Module, FileItem, AssignmentDetails, FolderDetails, ForumDetails,
+    PageDetails, SearchHit
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT,
+    image_url TEXT,
+    teachers TEXT
+);
+CREATE TABLE IF NOT EXISTS sections (
+    course_id INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    summary TEXT,
+    PRIMARY KEY (course_id, id)
+);
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY,
+    course_id INTEGER NOT NULL,
+    section_id TEXT,
+    position INTEGER NOT NULL,
+    type TEXT,
+    name TEXT,
+    url TEXT,
+    description TEXT,
+    completed INTEGER
+);
+CREATE INDEX IF NOT EXISTS modules_course ON modules (course_id);
+CREATE TABLE IF NOT EXISTS files (
+    module_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    filename TEXT,
+    mimetype TEXT,
+    PRIMARY KEY (module_id, url)
+);
+CREATE TABLE IF NOT EXISTS module_details (
+    module_id INTEGER PRIMARY KEY,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS doc_keys (
+    key TEXT PRIMARY KEY,
+    doc_id INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+"""
+
+# ref がモジュール ID を指すドキュメントの種類
+_MODULE_KINDS = ('module', 'page', 'assignment', 'forum')
+# 詳細ページを索引するモジュール種別
+_DETAIL_TYPES = ('page', 'assign', 'forum', 'folder')
+
+def _section_key(section: Section, position: int) -> str:
+    # data-sectionid がないセクションは位置で識別する
+    return section.id if section.id is not None else f"#{position}"
+
+def _hash(*parts) -> str:
+    return hashlib.blake2b(json.dumps(parts, ensure_ascii=False).encode('utf-8'), digest_size=12).hexdigest()
+
+class MoodleIndex:
+    """
+    Local SQLite index of courses, modules, files and page/intro text with FTS5 search.
+
+    Writes are incremental: documents whose content hash did not change are
+    skipped. Group writes in ``with index.transaction():`` to commit in bulk.
+    """
+
+    def __init__(self, path: str = "moodle_index.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self.tokenizer = self._create_fts_table()
+
+    def _create_fts_table(self) -> str:
+        # trigram は空白で区切られない日本語でも部分一致検索ができる (SQLite 3.34 以降)
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS documents "
+                    f"USING fts5(kind UNINDEXED, ref UNINDEXED, title, body, tokenize='{tokenizer}')"
+                )
+                row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'documents'").fetchone()
+                return "trigram" if "trigram" in row['sql'] else "unicode61"
+            except sqlite3.OperationalError:
+                continue
+        raise sqlite3.OperationalError("SQLite was built without FTS5")
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Groups writes into a single transaction (nestable)."""
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute("BEGIN")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.execute("COMMIT")
+
+    def _put_document(self, key: str, kind: str, ref: str, title: str, body: str) -> bool:
+        """Inserts or replaces one FTS document. Returns False if it was unchanged."""
+        digest = _hash(kind, ref, title, body)
+        row = self._conn.execute("SELECT doc_id, hash FROM doc_keys WHERE key = ?", (key,)).fetchone()
+        if row and row['hash'] == digest:
+            return False
+        if row:
+            self._conn.execute("DELETE FROM documents WHERE rowid = ?", (row['doc_id'],))
+        cursor = self._conn.execute(
+            "INSERT INTO documents (kind, ref, title, body) VALUES (?, ?, ?, ?)",
+            (kind, ref, title, body)
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO doc_keys (key, doc_id, hash) VALUES (?, ?, ?)",
+            (key, cursor.lastrowid, digest)
+        )
+        return True
+
+    def _delete_document(self, key: str):
+        row = self._conn.execute("SELECT doc_id FROM doc_keys WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM documents WHERE rowid = ?", (row['doc_id'],))
+            self._conn.execute("DELETE FROM doc_keys WHERE key = ?", (key,))
+
+    def _delete_documents(self, prefix: str):
+        """Deletes every document whose key starts with prefix (which must end with a delimiter)."""
+        rows = self._conn.execute("SELECT key, doc_id FROM doc_keys WHERE key LIKE ? ESCAPE '\\'",
+                                  (prefix.replace('%', '\\%').replace('_', '\\_') + '%',)).fetchall()
+        for row in rows:
+            self._conn.execute("DELETE FROM documents WHERE rowid = ?", (row['doc_id'],))
+            self._conn.execute("DELETE FROM doc_keys WHERE key = ?", (row['key'],))
+
+    # --- 書き込み ---
+
+    def add_course(self, course: Course):
+        with self.transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO courses (id, name, url, image_url, teachers) VALUES (?, ?, ?, ?, ?)",
+                (course.id, course.name, course.url, course.image_url, json.dumps(course.teachers, ensure_ascii=False))
+            )
+            self._put_document(f"course:{course.id}", 'course', str(course.id), course.name, " ".join(course.teachers))
+
+    def add_sections(self, course_id: int, sections: List[Section]) -> List[Module]:
+        """
+        Replaces the section/module structure of a course.
+        Returns the modules that are new or whose name/description changed.
+        """
+        changed: List[Module] = []
+        with self.transaction():
+            old = {row['id']: row for row in self._conn.execute(
+                "SELECT id, name, description, type FROM modules WHERE course_id = ?", (course_id,))}
+            seen = set()
+
+            self._conn.execute("DELETE FROM sections WHERE course_id = ?", (course_id,))
+            for s_pos, section in enumerate(sections):
+                section_key = _section_key(section, s_pos)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sections (course_id, id, position, name, summary) VALUES (?, ?, ?, ?, ?)",
+                    (course_id, section_key, s_pos, section.name, section.summary)
+                )
+                for m_pos, module in enumerate(section.modules):
+                    if module.id is None:
+                        continue
+                    seen.add(module.id)
+                    previous = old.get(module.id)
+                    if previous is None or previous['name'] != module.name or previous['description'] != module.description:
+                        changed.append(module)
+                        self._conn.execute("DELETE FROM module_details WHERE module_id = ?", (module.id,))
+                    self._conn.execute(
+                        "INSERT INTO modules (id, course_id, section_id, position, type, name, url, description, completed) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET course_id = excluded.course_id, section_id = excluded.section_id, "
+                        "position = excluded.position, type = excluded.type, name = excluded.name, url = excluded.url, "
+                        "description = excluded.description, completed = excluded.completed",
+                        (module.id, course_id, section_key, m_pos, module.type, module.name, module.url,
+                         module.description, int(module.completed))
+                    )
+                    self._put_document(f"module:{module.id}", 'module', str(module.id), module.name, module.description or "")
+
+            for module_id in set(old) - seen:
+                self.remove_module(module_id)
+        return changed
+
+    def remove_module(self, module_id: int):
+        with self.transaction():
+            self._conn.execute("DELETE FROM modules WHERE id = ?", (module_id,))
+            self._conn.execute("DELETE FROM files WHERE module_id = ?", (module_id,))
+            self._conn.execute("DELETE FROM module_details WHERE module_id = ?", (module_id,))
+            for kind in _MODULE_KINDS:
+                self._delete_document(f"{kind}:{module_id}")
+            self._delete_documents(f"file:{module_id}:")
+
+    def set_files(self, module_id: int, files: Sequence[FileItem]):
+        with self.transaction():
+            self._conn.execute("DELETE FROM files WHERE module_id = ?", (module_id,))
+            self._delete_documents(f"file:{module_id}:")
+            for item in files:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (module_id, url, filename, mimetype) VALUES (?, ?, ?, ?)",
+                    (module_id, item.url, item.filename, item.mimetype)
+                )
+                self._put_document(f"file:{module_id}:{item.url}", 'file', f"{module_id}:{item.url}", item.filename, "")
+
+    def add_page(self, module_id: int, details: PageDetails):
+        with self.transaction():
+            self._put_document(f"page:{module_id}", 'page', str(module_id), details.title, _html_text(details.content))
+
+    def add_assignment(self, module_id: int, details: AssignmentDetails):
+        with self.transaction():
+            self._put_document(f"assignment:{module_id}", 'assignment', str(module_id), details.title, details.intro)
+            self.set_files(module_id, list(details.attachments) + list(details.submission_files))
+
+    def add_forum(self, module_id: int, details: ForumDetails):
+        with self.transaction():
+            self._put_document(f"forum:{module_id}", 'forum', str(module_id), details.title, details.intro)
+
+    def add_folder(self, module_id: int, details: FolderDetails):
+        self.set_files(module_id, details.files)
+
+    # --- 読み出し ---
+
+    def get_course(self, course_id: int) -> Optional[Course]:
+        row = self._conn.execute("SELECT * FROM courses WHERE id = ?", (course_id,)).fetchone()
+        return _course(row) if row else None
+
+    def get_courses(self) -> List[Course]:
+        return [_course(row) for row in self._conn.execute("SELECT * FROM courses ORDER BY id")]
+
+    def get_module(self, module_id: int) -> Optional[Module]:
+        row = self._conn.execute("SELECT * FROM modules WHERE id = ?", (module_id,)).fetchone()
+        return _module(row) if row else None
+
+    def get_sections(self, course_id: int) -> List[Section]:
+        sections = []
+        for row in self._conn.execute("SELECT * FROM sections WHERE course_id = ? ORDER BY position", (course_id,)):
+            modules = [_module(m) for m in self._conn.execute(
+                "SELECT * FROM modules WHERE course_id = ? AND section_id = ? ORDER BY position", (course_id, row['id']))]
+            section_id = None if row['id'].startswith('#') else row['id']
+            sections.append(Section(id=section_id, name=row['name'], summary=row['summary'], modules=modules))
+        return sections
+
+    def get_files(self, module_id: int) -> List[FileItem]:
+        return [FileItem(filename=row['filename'], url=row['url'], mimetype=row['mimetype'])
+                for row in self._conn.execute("SELECT * FROM files WHERE module_id = ?", (module_id,))]
+
+    def search(self, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 20) -> List[SearchHit]:
+        """
+        Full-text search over everything indexed. Whitespace-separated terms must all match.
+        Returns hits with their Course / Module / FileItem attached, best match first.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        conditions = []
+        params: list = []
+        fts_terms = []
+        for term in terms:
+            if self.tokenizer == "trigram" and len(term) < 3:
+                # trigram は 3 文字未満の語を MATCH できないので LIKE で絞り込む
+                conditions.append("(title LIKE ? OR body LIKE ?)")
+                params.extend([f"%{term}%", f"%{term}%"])
+            else:
+                fts_terms.append('"' + term.replace('"', '""') + '"')
+        if fts_terms:
+            conditions.insert(0, "documents MATCH ?")
+            params.insert(0, " ".join(fts_terms))
+        if kinds:
+            kinds = list(kinds)
+            conditions.append(f"kind IN ({', '.join('?' * len(kinds))})")
+            params.extend(kinds)
+
+        score = "bm25(documents)" if fts_terms else "0.0"
+        sql = (f"SELECT kind, ref, title, snippet(documents, 3, '[', ']', '…', 12) AS snippet, {score} AS score "
+               f"FROM documents WHERE {' AND '.join(conditions)} ORDER BY score LIMIT ?")
+        params.append(limit)
+
+        hits = []
+        for row in self._conn.execute(sql, params):
+            hit = SearchHit(kind=row['kind'], title=row['title'], snippet=row['snippet'], score=-row['score'])
+            if row['kind'] == 'course':
+                hit.course = self.get_course(int(row['ref']))
+            elif row['kind'] in _MODULE_KINDS:
+                hit.module = self.get_module(int(row['ref']))
+            elif row['kind'] == 'file':
+                module_id, url = row['ref'].split(':', 1)
+                hit.module = self.get_module(int(module_id))
+                hit.file = next((f for f in self.get_files(int(module_id)) if f.url == url), None)
+            if hit.module and hit.course is None:
+                course_id = self._conn.execute("SELECT course_id FROM modules WHERE id = ?", (hit.module.id,)).fetchone()
+                if course_id:
+                    hit.course = self.get_course(course_id[0])
+            hits.append(hit)
+        return hits
+
+    # --- クロール ---
+
+    def update_from_api(self, api, courses: Optional[List[Course]] = None, details: bool = True, refresh: bool = False,
+                        details_max_age: Optional[float] = 86400.0):
+        """
+        Crawls courses with a MoodleAPI and updates the index.
+
+        Module details (pages, assignments, forums, folders) are fetched for
+        modules that are new or changed, whose details were never indexed (or
+        failed), or were indexed more than ``details_max_age`` seconds ago (to
+        pick up edited bodies). ``refresh`` refetches all of them.
+        Each course is committed in a single transaction.
+        """
+        if courses is None:
+            courses = api.get_my_courses()
+        for course in courses:
+            sections = api.get_course_contents(course.id)
+            with self.transaction():
+                self.add_course(course)
+                changed = self.add_sections(course.id, sections)
+                if not details:
+                    continue
+                modules = [m for s in sections for m in s.modules if m.type in _DETAIL_TYPES and m.id is not None]
+                if not refresh:
+                    indexed = self._details_indexed_at([m.id for m in modules])
+                    cutoff = None if details_max_age is None else time.time() - details_max_age
+                    modules = [m for m in modules if m.id not in indexed
+                               or (cutoff is not None and indexed[m.id] < cutoff)]
+                for module in modules:
+                    self._index_details(api, module)
+            logger.info(f"Indexed course {course.id} ({len(sections)} sections)")
+
+    def _details_indexed_at(self, module_ids: List[int]) -> Dict[int, float]:
+        indexed: Dict[int, float] = {}
+        for start in range(0, len(module_ids), 500):
+            chunk = module_ids[start:start + 500]
+            for row in self._conn.execute(
+                    f"SELECT module_id, indexed_at FROM module_details WHERE module_id IN ({', '.join('?' * len(chunk))})",
+                    chunk):
+                indexed[row['module_id']] = row['indexed_at']
+        return indexed
+
+    def _index_details(self, api, module: Module):
+        if module.id is None:
+            return
+        details = None
+        if module.type == 'page':
+            details = api.get_page_details(module.id)
+            if details:
+                self.add_page(module.id, details)
+        elif module.type == 'assign':
+            details = api.get_assignment_details(module.id)
+            if details:
+                self.add_assignment(module.id, details)
+        elif module.type == 'forum':
+            details = api.get_forum_details(module.id)
+            if details:
+                self.add_forum(module.id, details)
+        elif module.type == 'folder':
+            details = api.get_folder_details(module.id)
+            if details:
+                self.add_folder(module.id, details)
+
+        # 取得に失敗したモジュールは記録しないので、次回の更新で再取得される
+        if details:
+            self._conn.execute("INSERT OR REPLACE INTO module_details (module_id, indexed_at) VALUES (?, ?)",
+                               (module.id, time.time()))
+
+def _html_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser').get_text(separator="\n", strip=True)
+
+def _course(row) -> Course:
+    return Course(id=row['id'], name=row['name'], url=row['url'], image_url=row['image_url'],
+                  teachers=json.loads(row['teachers'] or "[]"))
+
+def _module(row) -> Module:
+    return Module(id=row['id'], type=row['type'], name=row['name'], url=row['url'],
+                  description=row['description'], completed=bool(row['completed']))
@@ -1,40 +1,21 @@
-from bs4 import BeautifulSoup
-from typing import List, Optional
-from pymoodle.types import Course, Category, Section, Module, FileItem, FolderDetails, AssignmentDetails, ForumDetails, PageDetails, QuizDetails, QuizAttempt, QuizQuestion, QuizAttemptData
-
-def parse_my_courses(html: str) -> List[Course]:
-    soup = BeautifulSoup(html, 'html.parser')
+import re
+from urllib.parse import parse_qs, urlparse
+from bs4 import BeautifulSoup, NavigableString
+from typing import List, Optional, Dict, Tuple
+from pymoodle.profiles import SiteProfile, LabelTable, ALL_LABELS, COURSE_LIST_SELECTORS, SECTION_SELECTORS, GRADE_OVERVIEW_SELECTORS, GRADE_REPORT_SELECTORS
+from pymoodle.types import Course, Category, Section, SectionInfo, Module, FileItem, FolderDetails, AssignmentDetails, ForumDetails, ForumDiscussion, ForumPost, PageDetails, QuizDetails, QuizAttempt, QuizQuestion, QuizAttemptData, QuizReview, QuizReviewQuestion, CourseGrade, GradeItem
+
+_BACKGROUND_URL_RE = re.compile(r"url\(['\"]?(.*?)['\"]?\)")
+_COURSE_COUNT_RE = re.compile(r'\((\d+)\)')
+_ANSWER_FIELD_RE = re.compile(r'q\d+:\d+_')
+_SEQUENCECHECK_RE = re.compile(r':sequencecheck$')
+_DIGITS_RE = re.compile(r'\d+')
+_MOD_VIEW_RE = re.compile(r'/mod/(\w+)/view\.php')
+_SESSKEY_RE = re.compile(r'"sesskey"\s*:\s*"([^"]+)"')
+_SESSKEY_INPUT_RE = re.compile(r'name="sesskey"\s+value="([^"]+)"|value="([^"]+)"\s+name="sesskey"')
+
+def _parse_course_boxes(course_items) -> List[Course]:
     courses: List[Course] = []
-
-    course_items = soup.select('.coursebox')
-    if not course_items:
-        course_items = soup.select('div[data-region="course-content"]')
-
-    if not course_items:
-         nav_links = soup.select('nav .list-group-item[href*="course/view.php"]')
-         for link in nav_links:
-             href = link.get('href')
-             name = link.get_text(strip=True)
-             if 'id=' in href:
-                 try:
-                     course_id = int(href.split('id=')[1].split('&')[0])
-                     courses.append(Course(
-                         id=course_id,
-                         name=name,
-                         url=href,
-                         image_url=None,
-                         teachers=[]
-                     ))
-                 except ValueError:
-                     pass
-         seen_ids = set()
-         unique_courses = []
-         for c in courses:
-             if c.id not in seen_ids:
-                 unique_courses.append(c)
-                 seen_ids.add(c.id)
-         return unique_courses
-
     for item in course_items:
         course_id_str = item.get('data-courseid')
 
@@ -49,7 +30,6 @@ def parse_my_courses(html: str) -> List[Course]:
             name = name_tag.get_text(strip=True)
 
         if not course_id_str:
-            from urllib.parse import parse_qs, urlparse
             try:
                 parsed_url = urlparse(url)
                 qs = parse_qs(parsed_url.query)
@@ -62,10 +42,9 @@ def parse_my_courses(html: str) -> List[Course]:
         image_url = None
         img_div = item.select_one('.card-img-top') or item.select_one('.course-image')
         if img_div:
-            import re
             style = img_div.get('style', '')
             if 'url(' in style:
-                match = re.search(r"url\(['\"]?(.*?)['\"]?\)", style)
+                match = _BACKGROUND_URL_RE.search(style)
                 if match:
                     image_url = match.group(1)
             else:
@@ -88,83 +67,267 @@ def parse_my_courses(html: str) -> List[Course]:
 
     return courses
 
-def parse_course_contents(html: str) -> List[Section]:
+def _labels(profile: Optional[SiteProfile]) -> LabelTable:
+    return profile.labels if profile else ALL_LABELS
+
+def _has_label(text: str, labels) -> bool:
+    return any(label in text for label in labels)
+
+def _select_first(soup, kind: str, defaults: List[str], profile: Optional[SiteProfile]):
+    """Tries the candidate selectors (the one that matched on this site first) and remembers the winner."""
+    candidates = profile.candidates(kind, defaults) if profile else defaults
+    for selector in candidates:
+        found = soup.select(selector)
+        if found:
+            if profile:
+                profile.remember(kind, selector)
+            return found
+    return []
+
+def parse_my_courses(html: str, profile: Optional[SiteProfile] = None) -> List[Course]:
     soup = BeautifulSoup(html, 'html.parser')
-    sections: List[Section] = []
+    courses: List[Course] = []
 
-    topic_list = soup.select('ul.topics li.section.main')
-    if not topic_list:
-         topic_list = soup.select('.course-content ul.topics li.section.main') or \
-                      soup.select('.course-content ul.weeks li.section.main')
+    course_items = _select_first(soup, 'course_list', COURSE_LIST_SELECTORS, profile)
 
-    for section in topic_list:
-        section_id = section.get('data-sectionid')
+    if not course_items:
+         nav_links = soup.select('nav .list-group-item[href*="course/view.php"]')
+         for link in nav_links:
+             href = link.get('href')
+             name = link.get_text(strip=True)
+             if 'id=' in href:
+                 try:
+                     course_id = int(href.split('id=')[1].split('&')[0])
+                     courses.append(Course(
+                         id=course_id,
+                         name=name,
+                         url=href,
+                         image_url=None,
+                         teachers=[]
+                     ))
+                 except ValueError:
+                     pass
+         seen_ids = set()
+         unique_courses = []
+         for c in courses:
+             if c.id not in seen_ids:
+                 unique_courses.append(c)
+                 seen_ids.add(c.id)
+         return unique_courses
 
-        name_tag = section.select_one('.sectionname')
-        if name_tag:
-            section_name = name_tag.get_text(strip=True)
-        else:
-            section_name = f"Section {section_id}"
+    return _parse_course_boxes(course_items)
 
-        summary_tag = section.select_one('.summary')
-        section_summary = summary_tag.get_text(strip=True) if summary_tag else ""
+# _parse_module の走査中に子孫へ引き継ぐ状態フラグ
+_IN_NAME = 1          # 最初の .instancename の内側
+_IN_HIDDEN = 2        # その中の .accesshide の内側
+_IN_DESC = 4          # 最初の .contentafterlink の内側
+_IN_INSTANCE = 8      # .activityinstance の内側
+_IN_COMPLETION = 16   # .autocompletion の内側
 
-        modules: List[Module] = []
-        module_items = section.select('ul.section li.activity')
+def _string_types(tag):
+    """The string classes Tag.get_text() would consider for this tag."""
+    types = tag.interesting_string_types
+    return tag.MAIN_CONTENT_STRING_TYPES if types is None else types
 
-        for mod in module_items:
-            mod_id_str = mod.get('id')
-            mod_id = int(mod_id_str.replace('module-', '')) if mod_id_str else None
+def _is_text(string, types) -> bool:
+    if isinstance(types, type):
+        return type(string) is types
+    return types is None or type(string) in types
 
-            classes = mod.get('class', [])
-            mod_type = "unknown"
-            for c in classes:
-                if c.startswith('modtype_'):
-                    mod_type = c.replace('modtype_', '')
-                    break
+def _parse_module(mod, labels: LabelTable = ALL_LABELS) -> Module:
+    """
+    Extracts a Module from an li.activity element in a single traversal.
 
-            instancename_tag = mod.select_one('.instancename')
-            link_tag = mod.select_one('.activityinstance a')
+    Equivalent to running select_one('.instancename'), select_one('.activityinstance a'),
+    select_one('.contentafterlink') and select_one('.autocompletion img') on the element
+    and dropping .accesshide text from the name, without repeated subtree scans or
+    mutating the tree.
+    """
+    mod_id_str = mod.get('id')
+    mod_id = int(mod_id_str.replace('module-', '')) if mod_id_str else None
+
+    classes = mod.get('class', [])
+    mod_type = "unknown"
+    for c in classes:
+        if c.startswith('modtype_'):
+            mod_type = c.replace('modtype_', '')
+            break
+
+    name_parts: Optional[List[str]] = None
+    name_types = None
+    desc_parts: Optional[List[str]] = None
+    desc_types = None
+    link_tag = None
+    completion_icon = None
+
+    root_flags = 0
+    if 'activityinstance' in classes:
+        root_flags |= _IN_INSTANCE
+    if 'autocompletion' in classes:
+        root_flags |= _IN_COMPLETION
+
+    stack = [(child, root_flags) for child in reversed(mod.contents)]
+    while stack:
+        node, flags = stack.pop()
+
+        if isinstance(node, NavigableString):
+            if flags & _IN_NAME and not flags & _IN_HIDDEN and _is_text(node, name_types):
+                text = node.strip()
+                if text:
+                    name_parts.append(text)
+            if flags & _IN_DESC and _is_text(node, desc_types):
+                text = node.strip()
+                if text:
+                    desc_parts.append(text)
+            continue
 
-            if instancename_tag:
-                for hidden in instancename_tag.select('.accesshide'):
-                    hidden.decompose()
-                mod_name = instancename_tag.get_text(strip=True)
-            else:
-                mod_name = "Untitled"
+        if link_tag is None and node.name == 'a' and flags & _IN_INSTANCE:
+            link_tag = node
+        if completion_icon is None and node.name == 'img' and flags & _IN_COMPLETION:
+            completion_icon = node
+
+        node_classes = node.get('class') or ()
+        if node_classes:
+            if 'accesshide' in node_classes and flags & _IN_NAME:
+                flags |= _IN_HIDDEN
+            if name_parts is None and 'instancename' in node_classes:
+                name_parts = []
+                name_types = _string_types(node)
+                flags |= _IN_NAME
+            if desc_parts is None and 'contentafterlink' in node_classes:
+                desc_parts = []
+                desc_types = _string_types(node)
+                flags |= _IN_DESC
+            if 'activityinstance' in node_classes:
+                flags |= _IN_INSTANCE
+            if 'autocompletion' in node_classes:
+                flags |= _IN_COMPLETION
+
+        if node.contents:
+            stack.extend((child, flags) for child in reversed(node.contents))
+
+    mod_name = "".join(name_parts) if name_parts is not None else "Untitled"
+    mod_url = link_tag['href'] if link_tag else None
+    description = "\n".join(desc_parts) if desc_parts is not None else None
+
+    is_completed = False
+    if completion_icon:
+        title = completion_icon.get('title', '') or completion_icon.get('alt', '')
+        if any(label in title for label in labels.completed) and \
+                not any(label in title for label in labels.not_completed):
+            is_completed = True
+
+    return Module(
+        id=mod_id,
+        type=mod_type,
+        name=mod_name,
+        url=mod_url,
+        description=description,
+        completed=is_completed
+    )
 
-            mod_url = link_tag['href'] if link_tag else None
+def _parse_section(section, labels: LabelTable = ALL_LABELS) -> Section:
+    section_id = section.get('data-sectionid')
 
-            description = None
-            desc_tag = mod.select_one('.contentafterlink')
-            if desc_tag:
-                description = desc_tag.get_text(separator="\n", strip=True)
+    name_tag = section.select_one('.sectionname')
+    if name_tag:
+        section_name = name_tag.get_text(strip=True)
+    else:
+        section_name = f"Section {section_id}"
 
-            is_completed = False
-            completion_icon = mod.select_one('.autocompletion img')
-            if completion_icon:
-                title = completion_icon.get('title', '') or completion_icon.get('alt', '')
-                if "完了: " in title and "未完了" not in title:
-                    is_completed = True
+    summary_tag = section.select_one('.summary')
+    section_summary = summary_tag.get_text(strip=True) if summary_tag else ""
 
-            modules.append(Module(
-                id=mod_id,
-                type=mod_type,
-                name=mod_name,
-                url=mod_url,
-                description=description,
-                completed=is_completed
-            ))
+    modules = [_parse_module(mod, labels) for mod in section.select('ul.section li.activity')]
 
-        sections.append(Section(
-            id=section_id,
-            name=section_name,
-            summary=section_summary,
-            modules=modules
-        ))
+    return Section(
+        id=section_id,
+        name=section_name,
+        summary=section_summary,
+        modules=modules
+    )
+
+def _select_sections(soup, profile: Optional[SiteProfile] = None):
+    return _select_first(soup, 'sections', SECTION_SELECTORS, profile)
+
+def parse_course_contents(html: str, profile: Optional[SiteProfile] = None) -> List[Section]:
+    soup = BeautifulSoup(html, 'html.parser')
+    labels = _labels(profile)
+    return [_parse_section(section, labels) for section in _select_sections(soup, profile)]
 
+def parse_section_fragment(html: str) -> Optional[Section]:
+    """Parses the HTML of a single li.section.main element cut out of a course page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    section = soup.find('li')
+    if not section or not {'section', 'main'}.issubset(section.get('class', [])):
+        return None
+    return _parse_section(section)
+
+def parse_single_section(html: str, number: int, profile: Optional[SiteProfile] = None) -> Optional[Section]:
+    """Parses the section shown on a ``course/view.php?id=X&section=N`` page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    labels = _labels(profile)
+    sections = _select_sections(soup, profile) or soup.select('li.section.main')
+    for section in sections:
+        if section.get('data-number') == str(number) or section.get('id') == f"section-{number}":
+            return _parse_section(section, labels)
+    # 古いテーマでは単一セクション表示の li に番号が付かない
+    return _parse_section(sections[0], labels) if len(sections) == 1 else None
+
+def parse_sesskey(html: str) -> Optional[str]:
+    """Extracts the sesskey from M.cfg (or a sesskey input) on any logged-in page."""
+    match = _SESSKEY_RE.search(html) or _SESSKEY_INPUT_RE.search(html)
+    if not match:
+        return None
+    return next(group for group in match.groups() if group)
+
+def parse_course_state(state: Dict) -> List[SectionInfo]:
+    """Builds the section list from a core_courseformat_get_state result (Moodle 4.0+)."""
+    sections: List[SectionInfo] = []
+    for item in state.get('section', []):
+        number = item.get('number', item.get('section'))
+        if number is None:
+            continue
+        sections.append(SectionInfo(
+            number=int(number),
+            id=int(item['id']) if item.get('id') is not None else None,
+            name=item.get('title') or item.get('rawtitle') or f"Section {number}",
+            url=item.get('sectionurl'),
+            module_ids=[int(cm_id) for cm_id in item.get('cmlist', [])],
+            visible=bool(item.get('visible', True))
+        ))
+    sections.sort(key=lambda s: s.number)
     return sections
 
+def parse_course_state_section(state: Dict, number: int) -> Optional[Section]:
+    """
+    Builds one section with its modules from a core_courseformat_get_state
+    result. Module descriptions are not part of the state and are left empty.
+    """
+    cms = {int(cm['id']): cm for cm in state.get('cm', []) if cm.get('id') is not None}
+    for item in state.get('section', []):
+        if str(item.get('number', item.get('section'))) != str(number):
+            continue
+        modules = []
+        for cm_id in item.get('cmlist', []):
+            cm = cms.get(int(cm_id), {})
+            modules.append(Module(
+                id=int(cm_id),
+                type=cm.get('module') or cm.get('modname') or '',
+                name=cm.get('name', ''),
+                url=cm.get('url'),
+                description=None,
+                completed=bool(cm.get('completionstate'))
+            ))
+        # コースページの data-sectionid と同じくセクション番号を id にする
+        return Section(
+            id=str(number),
+            name=item.get('title') or item.get('rawtitle') or "",
+            summary="",
+            modules=modules
+        )
+    return None
+
 def parse_categories(html: str, is_subcategory: bool = False) -> List[Category]:
     soup = BeautifulSoup(html, 'html.parser')
     categories: List[Category] = []
@@ -191,8 +354,7 @@ def parse_categories(html: str, is_subcategory: bool = False) -> List[Category]:
         count_span = item.select_one('.numberofcourse')
         course_count = 0
         if count_span:
-            import re
-            match = re.search(r'\((\d+)\)', count_span.get_text())
+            match = _COURSE_COUNT_RE.search(count_span.get_text())
             if match:
                 course_count = int(match.group(1))
 
@@ -206,6 +368,11 @@ def parse_categories(html: str, is_subcategory: bool = False) -> List[Category]:
 
     return categories
 
+def parse_category_courses(html: str) -> List[Course]:
+    """Parses the course list of a course/index.php?categoryid=X page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    return _parse_course_boxes(soup.select('.courses .coursebox'))
+
 def parse_resource_url(html: str) -> Optional[str]:
     soup = BeautifulSoup(html, 'html.parser')
 
@@ -230,7 +397,35 @@ def parse_resource_url(html: str) -> Optional[str]:
     return None
 
 def parse_external_url(html: str) -> Optional[str]:
+    """
+    Extracts the target of a URL module page that did not redirect
+    (display modes: embed, frame, new window / popup).
+    """
     soup = BeautifulSoup(html, 'html.parser')
+
+    # 新しいウィンドウ / ポップアップ: 「... リンクをクリックしてください」
+    workaround = soup.select_one('.urlworkaround a[href]')
+    if workaround:
+        return workaround['href']
+
+    # 埋め込み表示
+    content_div = soup.select_one('.resourcecontent')
+    if content_div:
+        embed = content_div.select_one('iframe[src], embed[src]')
+        if embed:
+            return embed['src']
+        obj_tag = content_div.select_one('object[data]')
+        if obj_tag:
+            return obj_tag['data']
+        link = content_div.find('a', href=True)
+        if link:
+            return link['href']
+
+    # フレーム表示: 1 つ目のフレームは Moodle のナビゲーション
+    frames = soup.select('frameset frame[src]')
+    if frames:
+        return frames[-1]['src']
+
     return None
 
 def _parse_file_tree(container) -> List[FileItem]:
@@ -266,7 +461,7 @@ def _parse_file_tree(container) -> List[FileItem]:
         ))
     return files
 
-def parse_folder(html: str) -> FolderDetails:
+def parse_folder(html: str, profile: Optional[SiteProfile] = None) -> FolderDetails:
     soup = BeautifulSoup(html, 'html.parser')
 
     title = ""
@@ -296,7 +491,7 @@ def parse_folder(html: str) -> FolderDetails:
         download_all_url=download_all_url
     )
 
-def parse_assignment(html: str) -> AssignmentDetails:
+def parse_assignment(html: str, profile: Optional[SiteProfile] = None) -> AssignmentDetails:
     soup = BeautifulSoup(html, 'html.parser')
 
     title = ""
@@ -306,6 +501,7 @@ def parse_assignment(html: str) -> AssignmentDetails:
 
     intro_div = soup.select_one('#intro')
     intro = intro_div.get_text(separator="\n", strip=True) if intro_div else ""
+    intro_html = intro_div.decode_contents() if intro_div else ""
 
     # 添付ファイル (introの直後にあるファイルツリー)
     attachments: List[FileItem] = []
@@ -325,6 +521,7 @@ def parse_assignment(html: str) -> AssignmentDetails:
     submission_files: List[FileItem] = []
 
     if status_table:
+        labels = _labels(profile)
         rows = status_table.select('tr')
         for row in rows:
             th = row.select_one('th')
@@ -334,17 +531,17 @@ def parse_assignment(html: str) -> AssignmentDetails:
             header = th.get_text(strip=True)
             value = td.get_text(strip=True)
 
-            if "提出ステータス" in header:
+            if _has_label(header, labels.submission_status):
                 submission_status = value
-            elif "評定ステータス" in header:
+            elif _has_label(header, labels.grading_status):
                 grading_status = value
-            elif "終了日時" in header:
+            elif _has_label(header, labels.due_date):
                 due_date = value
-            elif "残り時間" in header:
+            elif _has_label(header, labels.time_remaining):
                 time_remaining = value
-            elif "最終更新日時" in header:
+            elif _has_label(header, labels.last_modified):
                 last_modified = value
-            elif "ファイル提出" in header:
+            elif _has_label(header, labels.file_submissions):
                 # ファイル提出セル内のツリー
                 submission_files = _parse_file_tree(td)
 
@@ -357,10 +554,11 @@ def parse_assignment(html: str) -> AssignmentDetails:
         due_date=due_date,
         time_remaining=time_remaining,
         last_modified=last_modified,
-        submission_files=submission_files
+        submission_files=submission_files,
+        intro_html=intro_html
     )
 
-def parse_forum(html: str) -> ForumDetails:
+def parse_forum(html: str, profile: Optional[SiteProfile] = None) -> ForumDetails:
     soup = BeautifulSoup(html, 'html.parser')
 
     title = ""
@@ -370,6 +568,7 @@ def parse_forum(html: str) -> ForumDetails:
 
     intro_div = soup.select_one('#intro')
     intro = intro_div.get_text(separator="\n", strip=True) if intro_div else ""
+    intro_html = intro_div.decode_contents() if intro_div else ""
 
     has_discussions = True
     if soup.select_one('.forumnodiscuss'):
@@ -378,10 +577,188 @@ def parse_forum(html: str) -> ForumDetails:
     return ForumDetails(
         title=title,
         intro=intro,
-        has_discussions=has_discussions
+        has_discussions=has_discussions,
+        intro_html=intro_html
     )
 
-def parse_page(html: str) -> PageDetails:
+def _query_int(url: Optional[str], name: str) -> Optional[int]:
+    if not url:
+        return None
+    try:
+        return int(parse_qs(urlparse(url).query)[name][0])
+    except (ValueError, KeyError, IndexError):
+        return None
+
+def parse_grades_overview(html: str, profile: Optional[SiteProfile] = None) -> List[CourseGrade]:
+    """Parses grade/report/overview/index.php (one row per enrolled course)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    grades: List[CourseGrade] = []
+    for row in _select_first(soup, 'grades_overview', GRADE_OVERVIEW_SELECTORS, profile):
+        if 'emptyrow' in (row.get('class') or []):
+            continue
+        cells = row.find_all(['td', 'th'], recursive=False)
+        if len(cells) < 2:
+            continue
+        link = cells[0].find('a', href=True)
+        url = link['href'] if link else None
+        grades.append(CourseGrade(
+            course_id=_query_int(url, 'id'),
+            course_name=cells[0].get_text(strip=True),
+            grade=cells[1].get_text(strip=True),
+            rank=cells[2].get_text(strip=True) if len(cells) > 2 else None,
+            url=url,
+        ))
+    return grades
+
+def _grade_cell(row, column: str) -> str:
+    cell = row.select_one(f'.column-{column}')
+    return cell.get_text(' ', strip=True) if cell else ""
+
+def parse_user_grade_report(html: str, profile: Optional[SiteProfile] = None) -> List[GradeItem]:
+    """
+    Parses a course's grade/report/user/index.php. Category header rows (which
+    have no grade cell) are skipped; category and course totals are kept.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    labels = _labels(profile)
+    items: List[GradeItem] = []
+    for row in _select_first(soup, 'grade_report', GRADE_REPORT_SELECTORS, profile):
+        name_cell = row.select_one('.column-itemname')
+        if not name_cell or not row.select_one('.column-grade'):
+            continue
+        name = name_cell.get_text(' ', strip=True)
+        if not name:
+            continue
+
+        link = name_cell.find('a', href=_MOD_VIEW_RE)
+        if link:
+            item_type = _MOD_VIEW_RE.search(link['href']).group(1)
+            module_id = _query_int(link['href'], 'id')
+        else:
+            item_type = 'course' if _has_label(name, labels.course_total) else 'category'
+            module_id = None
+
+        items.append(GradeItem(
+            name=name,
+            item_type=item_type,
+            module_id=module_id,
+            weight=_grade_cell(row, 'weight'),
+            grade=_grade_cell(row, 'grade'),
+            range=_grade_cell(row, 'range'),
+            percentage=_grade_cell(row, 'percentage'),
+            letter=_grade_cell(row, 'lettergrade'),
+            feedback=_grade_cell(row, 'feedback'),
+            contribution=_grade_cell(row, 'contributiontocoursetotal'),
+        ))
+    return items
+
+def parse_forum_discussions(html: str) -> List[ForumDiscussion]:
+    """Parses the discussion list of mod/forum/view.php (Moodle 3.x and 4.x layouts)."""
+    return _select_forum_discussions(BeautifulSoup(html, 'html.parser'))
+
+def parse_forum_discussions_page(html: str) -> Tuple[List[ForumDiscussion], Optional[str]]:
+    """Parses one page of the discussion list: (discussions, next page link or None)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    return _select_forum_discussions(soup), _select_next_page_url(soup)
+
+def _select_forum_discussions(soup) -> List[ForumDiscussion]:
+    discussions: List[ForumDiscussion] = []
+
+    for row in soup.select('tr.discussion'):
+        link = row.select_one('.topic a[href*="discuss.php"]') or row.select_one('a[href*="discuss.php"]')
+        if not link:
+            continue
+        discussion_id = row.get('data-discussionid')
+        discussion_id = int(discussion_id) if discussion_id and discussion_id.isdigit() else _query_int(link['href'], 'd')
+        if discussion_id is None:
+            continue
+
+        author = None
+        author_tag = row.select_one('td.author .author-info .text-truncate') or row.select_one('td.author')
+        if author_tag:
+            author = author_tag.get_text(" ", strip=True) or None
+
+        replies = None
+        replies_tag = row.select_one('td.replies') or row.select_one('[data-region="replies"]')
+        if replies_tag:
+            match = _DIGITS_RE.search(replies_tag.get_text())
+            if match:
+                replies = int(match.group(0))
+
+        last_post = None
+        last_post_id = None
+        last_link = row.select_one('a[href*="parent="]')
+        if last_link:
+            last_post_id = _query_int(last_link['href'], 'parent')
+            last_cell = row.select_one('td.lastpost') or last_link
+            last_post = last_cell.get_text(" ", strip=True) or None
+
+        discussions.append(ForumDiscussion(
+            id=discussion_id,
+            subject=link.get('title') or link.get_text(strip=True),
+            url=link['href'],
+            author=author,
+            replies=replies,
+            last_post=last_post,
+            last_post_id=last_post_id
+        ))
+
+    return discussions
+
+def parse_next_page_url(html: str) -> Optional[str]:
+    """Returns the "next page" link of a paging bar, or None on the last page."""
+    return _select_next_page_url(BeautifulSoup(html, 'html.parser'))
+
+def _select_next_page_url(soup) -> Optional[str]:
+    for bar in soup.select('nav .pagination, ul.pagination, .paging'):
+        link = bar.select_one('a.next[href], a[rel="next"][href], [data-control="next"] a[href]')
+        if link:
+            return link['href']
+        # 3.7 以降のページングバーは「次へ」に専用のクラスがないので、現在のページの次のリンクを使う
+        current = bar.select_one('li.active, li.page-item.active')
+        if current:
+            for sibling in current.find_next_siblings('li'):
+                link = sibling.find('a', href=True)
+                if link:
+                    return link['href']
+    return None
+
+def parse_forum_posts(html: str, discussion_id: int) -> List[ForumPost]:
+    """Parses the posts of mod/forum/discuss.php (Moodle 3.x and 4.x layouts)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    posts: List[ForumPost] = []
+
+    post_tags = soup.select('[data-region="post"][data-post-id]') or soup.select('div.forumpost')
+    for post in post_tags:
+        post_id = post.get('data-post-id')
+        if not post_id:
+            # 旧レイアウトでは id="p123"
+            anchor = post.get('id') or ''
+            post_id = anchor[1:] if anchor.startswith('p') else None
+        post_id = int(post_id) if post_id and post_id.isdigit() else None
+
+        subject_tag = (post.select_one('[data-region-content="forum-post-core-subject"]')
+                       or post.select_one('.subject') or post.select_one('h3, h4'))
+        author_tag = post.select_one('.author a') or post.select_one('[data-region="author-name"]') or post.select_one('.author')
+        time_tag = post.select_one('time')
+        if time_tag:
+            time_text = time_tag.get('datetime') or time_tag.get_text(strip=True)
+        else:
+            time_text = None
+        content_tag = post.select_one('.post-content-container') or post.select_one('.posting')
+
+        posts.append(ForumPost(
+            id=post_id,
+            discussion_id=discussion_id,
+            subject=subject_tag.get_text(strip=True) if subject_tag else "",
+            author=author_tag.get_text(strip=True) if author_tag else None,
+            time=time_text,
+            content=content_tag.decode_contents() if content_tag else ""
+        ))
+
+    return posts
+
+def parse_page(html: str, profile: Optional[SiteProfile] = None) -> PageDetails:
     soup = BeautifulSoup(html, 'html.parser')
 
     title = ""
@@ -398,7 +775,10 @@ def parse_page(html: str) -> PageDetails:
     last_modified = ""
     modified_div = soup.select_one('.modified')
     if modified_div:
-        last_modified = modified_div.get_text(strip=True).replace("最終更新日時:", "").strip()
+        last_modified = modified_div.get_text(strip=True)
+        for label in _labels(profile).last_modified:
+            last_modified = last_modified.replace(f"{label}:", "")
+        last_modified = last_modified.strip()
 
     return PageDetails(
         title=title,
@@ -406,7 +786,7 @@ def parse_page(html: str) -> PageDetails:
         last_modified=last_modified
     )
 
-def parse_quiz(html: str) -> QuizDetails:
+def parse_quiz(html: str, profile: Optional[SiteProfile] = None) -> QuizDetails:
     soup = BeautifulSoup(html, 'html.parser')
 
     title = ""
@@ -418,6 +798,7 @@ def parse_quiz(html: str) -> QuizDetails:
     if not intro_div:
         intro_div = soup.select_one('.quizinfo')
     intro = intro_div.get_text(separator="\n", strip=True) if intro_div else ""
+    intro_html = intro_div.decode_contents() if intro_div else ""
 
     attempts: List[QuizAttempt] = []
     summary_table = soup.select_one('.quizattemptsummary')
@@ -425,19 +806,20 @@ def parse_quiz(html: str) -> QuizDetails:
         # ヘッダーから列インデックスを特定
         headers = [th.get_text(strip=True) for th in summary_table.select('thead th')]
 
+        labels = _labels(profile)
         grade_idx = -1
         review_idx = -1
         feedback_idx = -1
 
         for i, h in enumerate(headers):
-            if "評点" in h or "素点" in h or "Grade" in h or "Marks" in h:
+            if _has_label(h, labels.grade):
                 # 評点列が複数ある場合（素点と評点など）、最後のものを採用するか、
                 # "評点 /" を優先するなどのロジックが必要。
                 # ここでは単純に「評点」を含む最後の列をgradeとする（素点があっても評点が重要）
                 grade_idx = i
-            elif "レビュー" in h or "Review" in h:
+            elif _has_label(h, labels.review):
                 review_idx = i
-            elif "フィードバック" in h or "Feedback" in h:
+            elif _has_label(h, labels.feedback):
                 feedback_idx = i
 
         rows = summary_table.select('tbody tr')
@@ -508,7 +890,8 @@ def parse_quiz(html: str) -> QuizDetails:
         can_attempt=can_attempt,
         cmid=cmid,
         sesskey=sesskey,
-        latest_attempt_data=None
+        latest_attempt_data=None,
+        intro_html=intro_html
     )
 
 def parse_quiz_attempt(html: str) -> Optional[QuizAttemptData]:
@@ -588,7 +971,7 @@ def parse_quiz_attempt(html: str) -> Optional[QuizAttemptData]:
                             # We should only exclude if value is empty OR text looks like a placeholder
                             if val is not None: # value="" is empty string, value=None is missing attribute
                                 # Check for common placeholder text
-                                if val == '0' and (text.startswith("選択") or text.startswith("Choose") or text == ""):
+                                if val == '0' and (text.startswith(ALL_LABELS.choose) or text == ""):
                                     continue
                                 if val == "":
                                     continue
@@ -615,14 +998,13 @@ def parse_quiz_attempt(html: str) -> Optional[QuizAttemptData]:
 
                 # Now look for remaining inputs/selects that are question answers
                 # Moodle question inputs usually have names starting with q\d+:\d+_
-                import re
                 remaining_controls = formulation.find_all(['input', 'select'])
                 for control in remaining_controls:
                     name = control.get('name', '')
                     if not name or 'sequencecheck' in name: continue
 
                     # Check if it looks like a question answer field
-                    if re.match(r'q\d+:\d+_', name):
+                    if _ANSWER_FIELD_RE.match(name):
                         stype = "text" if control.name == 'input' else "select"
                         options = []
                         if stype == "select":
@@ -631,7 +1013,7 @@ def parse_quiz_attempt(html: str) -> Optional[QuizAttemptData]:
                                 text = opt.get_text(strip=True)
                                 # Same logic as above
                                 if val is not None:
-                                    if val == '0' and (text.startswith("選択") or text.startswith("Choose") or text == ""):
+                                    if val == '0' and (text.startswith(ALL_LABELS.choose) or text == ""):
                                         continue
                                     if val == "":
                                         continue
@@ -660,7 +1042,7 @@ def parse_quiz_attempt(html: str) -> Optional[QuizAttemptData]:
         # Extract sequencecheck
         # It's usually an input type="hidden" inside the question div with name ending in :sequencecheck
         sequencecheck = None
-        seq_input = q_div.find('input', attrs={'name': re.compile(r':sequencecheck$')})
+        seq_input = q_div.find('input', attrs={'name': _SEQUENCECHECK_RE})
         if seq_input:
             sequencecheck = seq_input.get('value')
 
@@ -678,10 +1060,146 @@ def parse_quiz_attempt(html: str) -> Optional[QuizAttemptData]:
             sequencecheck=sequencecheck
         ))
 
+    this_page = _int_input(form, 'thispage', 0)
+    next_page = _int_input(form, 'nextpage', -1)
+
+    # ナビゲーションブロックのボタンからページ数と各ページの URL を取得
+    page_urls = {}
+    for button in soup.select('#mod_quiz_navblock .qnbutton[data-quiz-page]'):
+        try:
+            page = int(button['data-quiz-page'])
+        except ValueError:
+            continue
+        href = button.get('href')
+        if href and page not in page_urls:
+            page_urls[page] = href
+    page_count = max(max(page_urls, default=0) + 1, this_page + 1)
+
+    summary_url = None
+    end_link = soup.select_one('#mod_quiz_navblock .endtestlink')
+    if end_link:
+        summary_url = end_link.get('href')
+
+    if next_page == -1:
+        next_url = summary_url
+    else:
+        next_url = page_urls.get(next_page)
+
     return QuizAttemptData(
         attempt_id=attempt_id,
         sesskey=sesskey,
         slots=slots,
         questions=questions,
-        next_url=None # Logic to find next page URL if needed
+        next_url=next_url,
+        this_page=this_page,
+        next_page=next_page,
+        page_count=page_count,
+        page_urls=page_urls,
+        summary_url=summary_url
     )
+
+def _int_input(form, name: str, default: int) -> int:
+    tag = form.select_one(f'input[name="{name}"]')
+    try:
+        return int(tag['value'])
+    except (TypeError, KeyError, ValueError):
+        return default
+
+def parse_quiz_summary(html: str) -> Dict[str, str]:
+    """Parses the question status table of mod/quiz/summary.php."""
+    soup = BeautifulSoup(html, 'html.parser')
+    statuses: Dict[str, str] = {}
+    for row in soup.select('table.quizsummaryofattempt tbody tr'):
+        cells = row.select('td, th')
+        if len(cells) < 2:
+            continue
+        number = cells[0].get_text(strip=True)
+        if number:
+            statuses[number] = cells[1].get_text(strip=True)
+    return statuses
+
+def _response_values(formulation) -> List[str]:
+    """Collects the answers shown in a reviewed question's formulation."""
+    values: List[str] = []
+    for control in formulation.find_all(['input', 'select', 'textarea']):
+        if control.name == 'select':
+            option = control.find('option', selected=True)
+            if option and option.get('value', '') != '':
+                values.append(option.get_text(strip=True))
+        elif control.name == 'textarea':
+            text = control.get_text(strip=True)
+            if text:
+                values.append(text)
+        else:
+            input_type = (control.get('type') or 'text').lower()
+            if input_type in ('radio', 'checkbox'):
+                if not control.has_attr('checked'):
+                    continue
+                label = None
+                if control.get('id'):
+                    label = formulation.find('label', attrs={'for': control['id']})
+                if label is None:
+                    label = control.find_next_sibling(['label', 'div'])
+                values.append(label.get_text(" ", strip=True) if label else control.get('value', ''))
+            elif input_type == 'text':
+                value = control.get('value', '')
+                if value:
+                    values.append(value)
+    return values
+
+def parse_quiz_review(html: str) -> QuizReview:
+    """Parses mod/quiz/review.php."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    summary: Dict[str, str] = {}
+    for row in soup.select('table.quizreviewsummary tr'):
+        th = row.select_one('th')
+        td = row.select_one('td')
+        if th and td:
+            summary[th.get_text(strip=True)] = td.get_text(" ", strip=True)
+
+    attempt_id = None
+    attempt_input = soup.select_one('input[name="attempt"]')
+    if attempt_input:
+        attempt_id = attempt_input.get('value')
+
+    questions: List[QuizReviewQuestion] = []
+    for q_div in soup.select('.que'):
+        q_no_tag = q_div.select_one('.info .qno')
+        try:
+            q_no = int(q_no_tag.get_text(strip=True)) if q_no_tag else 0
+        except ValueError:
+            q_no = 0
+
+        state_tag = q_div.select_one('.info .state')
+        grade_tag = q_div.select_one('.info .grade')
+
+        text = ""
+        response: List[str] = []
+        formulation = q_div.select_one('.formulation')
+        if formulation:
+            response = _response_values(formulation)
+            qtext = formulation.select_one('.qtext') or formulation
+            text = qtext.get_text(separator="\n", strip=True)
+
+        right_answer_tag = q_div.select_one('.rightanswer')
+        feedback_parts = [tag.get_text(separator="\n", strip=True)
+                          for tag in q_div.select('.specificfeedback, .generalfeedback')]
+        feedback = "\n".join(part for part in feedback_parts if part) or None
+
+        classes = q_div.get('class', [])
+        q_type = next((c for c in classes if c not in ("que", "deferredfeedback", "immediatefeedback", "interactive")), "unknown")
+
+        questions.append(QuizReviewQuestion(
+            id=q_div.get('id'),
+            number=q_no,
+            type=q_type,
+            text=text,
+            state=state_tag.get_text(strip=True) if state_tag else "",
+            marks=grade_tag.get_text(strip=True) if grade_tag else None,
+            response=response,
+            right_answer=right_answer_tag.get_text(separator="\n", strip=True) if right_answer_tag else None,
+            feedback=feedback
+        ))
+
+    return QuizReview(attempt_id=attempt_id, summary=summary, questions=questions)
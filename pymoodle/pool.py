@@ -0,0 +1,239 @@
+import re
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import Future
+from dataclasses import replace
+from urllib.parse import urlparse
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+
+from pymoodle.client import MoodleClient
+from pymoodle.types import TenantMetrics
+
+logger = logging.getLogger(__name__)
+
+TenantKey = Tuple[str, str]  # (base_url, account)
+
+class _HostAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter shared by every client of one host that lets at most
+    ``limit`` requests run at once, including requests a single task makes
+    from its own threads (get_all_quiz_reviews, hydrate_course, ...).
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(pool_connections=1, pool_maxsize=limit)
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def send(self, request, stream=False, **kwargs):
+        with self._slots:
+            response = super().send(request, stream=stream, **kwargs)
+            if not stream:
+                # 本文の読み込みも枠の中で行う (ストリーミングはヘッダーまで)
+                response.content
+            return response
+
+class _Tenant:
+    def __init__(self, client: MoodleClient, host: str, metrics: TenantMetrics,
+                 session_file: str, store_dir: Optional[str]):
+        self.client = client
+        self.host = host
+        self.metrics = metrics
+        self.session_file = session_file
+        self.store_dir = store_dir
+        self.queue: Deque[Tuple[Future, Callable, tuple, dict, float]] = deque()
+
+class MoodleClientPool:
+    """
+    Shares connections and schedules work across many Moodle sites and accounts.
+
+    Clients are keyed by (base_url, account). Each keeps its own cookies, but
+    clients of the same host share one connection pool. Work is submitted per
+    tenant with ``submit``. Tenants take turns (round-robin), so a tenant with
+    a long queue cannot starve the others. At most ``max_concurrency`` tasks
+    run overall, and at most ``per_host_limit`` tasks run against one host.
+    The per-host limit also caps concurrent requests, so a task that fans out
+    over its own threads cannot exceed it either.
+    """
+
+    def __init__(self, max_concurrency: int = 16, per_host_limit: int = 4):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self._tenants: "OrderedDict[TenantKey, _Tenant]" = OrderedDict()
+        self._adapters: Dict[str, _HostAdapter] = {}
+        self._host_running: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._rotation = 0
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"moodle-pool-{i}", daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def client(self, base_url: str, account: str, session_file: Optional[str] = None,
+               store_dir: Optional[str] = None) -> MoodleClient:
+        """
+        Returns the client for (base_url, account), creating it on first use.
+
+        :param session_file: Defaults to a per-tenant file name
+                             (``session_<host>_<account>.json``).
+
+        For an existing tenant, ``session_file`` and ``store_dir`` may be
+        omitted; a value that differs from the one the client was created
+        with raises ValueError instead of being ignored.
+        """
+        key = (base_url, account)
+        with self._cond:
+            tenant = self._tenants.get(key)
+            if tenant:
+                if session_file is not None and session_file != tenant.session_file:
+                    raise ValueError(f"{base_url} ({account}) already uses session_file={tenant.session_file!r}")
+                if store_dir is not None and store_dir != tenant.store_dir:
+                    raise ValueError(f"{base_url} ({account}) already uses store_dir={tenant.store_dir!r}")
+                return tenant.client
+            if self._closed:
+                raise RuntimeError("MoodleClientPool is closed")
+
+            host = urlparse(base_url).netloc.lower()
+            if session_file is None:
+                safe = re.sub(r'[^A-Za-z0-9_.-]', '_', f"{host}_{account}")
+                session_file = f"session_{safe}.json"
+            client = MoodleClient(base_url, session_file=session_file, store_dir=store_dir)
+            metrics = TenantMetrics(base_url=base_url, account=account)
+
+            # 同じホストのクライアントは接続プールと同時リクエスト数の枠を共有する (Cookie はセッションごと)
+            adapter = self._adapters.get(host)
+            if adapter is None:
+                adapter = _HostAdapter(self.per_host_limit)
+                self._adapters[host] = adapter
+            http = client.session.session
+            for scheme in ("https://", "http://"):
+                http.mount(f"{scheme}{host}/", adapter)
+            http.hooks['response'].append(self._response_hook(metrics))
+
+            self._tenants[key] = _Tenant(client, host, metrics, session_file, store_dir)
+            return client
+
+    def _response_hook(self, metrics: TenantMetrics):
+        def hook(response, *args, **kwargs):
+            with self._cond:
+                metrics.requests += 1
+                if response.status_code >= 400:
+                    metrics.http_errors += 1
+        return hook
+
+    def submit(self, base_url: str, account: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Queues ``fn(client, *args, **kwargs)`` for the tenant and returns a Future.
+        The tenant's client is created if needed.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MoodleClientPool is closed")
+        self.client(base_url, account)
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MoodleClientPool is closed")
+            tenant = self._tenants[(base_url, account)]
+            tenant.queue.append((future, fn, args, kwargs, time.monotonic()))
+            tenant.metrics.submitted += 1
+            tenant.metrics.queued += 1
+            self._cond.notify()
+        return future
+
+    def map(self, base_url: str, account: str, fn: Callable[..., Any], items) -> List[Any]:
+        """Runs ``fn(client, item)`` for every item through the scheduler and returns the results in order."""
+        futures = [self.submit(base_url, account, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def _next_task(self) -> Optional[Tuple[_Tenant, tuple]]:
+        """Picks the next runnable task, rotating over tenants (caller holds the lock)."""
+        tenants = list(self._tenants.values())
+        if not tenants:
+            return None
+        if sum(self._host_running.values()) >= self.max_concurrency:
+            return None
+        for offset in range(len(tenants)):
+            tenant = tenants[(self._rotation + offset) % len(tenants)]
+            if not tenant.queue or self._host_running.get(tenant.host, 0) >= self.per_host_limit:
+                continue
+            self._rotation = (self._rotation + offset + 1) % len(tenants)
+            return tenant, tenant.queue.popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    picked = self._next_task()
+                    if picked:
+                        break
+                    if self._closed and not any(t.queue for t in self._tenants.values()):
+                        return
+                    self._cond.wait()
+                tenant, (future, fn, args, kwargs, queued_at) = picked
+                self._host_running[tenant.host] = self._host_running.get(tenant.host, 0) + 1
+                tenant.metrics.queued -= 1
+                tenant.metrics.running += 1
+                started = time.monotonic()
+                tenant.metrics.wait_time += started - queued_at
+
+            ok = False
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(tenant.client, *args, **kwargs))
+                    ok = True
+                except BaseException as e:
+                    future.set_exception(e)
+                    logger.error(f"Task for {tenant.metrics.base_url} ({tenant.metrics.account}) failed: {e}")
+
+            with self._cond:
+                self._host_running[tenant.host] -= 1
+                tenant.metrics.running -= 1
+                tenant.metrics.run_time += time.monotonic() - started
+                if ok:
+                    tenant.metrics.completed += 1
+                elif not future.cancelled():
+                    tenant.metrics.failed += 1
+                # ホストの枠が空いたので、待っている他のワーカーを起こす
+                self._cond.notify_all()
+
+    def metrics(self) -> Dict[TenantKey, TenantMetrics]:
+        """Returns a snapshot of every tenant's metrics."""
+        with self._cond:
+            return {key: replace(tenant.metrics) for key, tenant in self._tenants.items()}
+
+    def host_running(self) -> Dict[str, int]:
+        with self._cond:
+            return {host: n for host, n in self._host_running.items() if n}
+
+    def close(self, wait: bool = True):
+        """
+        Stops accepting work. Queued tasks still run; with ``wait`` this blocks
+        until they finish. Connections are closed once the last task is done.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            self._shutdown()
+        else:
+            threading.Thread(target=self._shutdown, name="moodle-pool-close", daemon=True).start()
+
+    def _shutdown(self):
+        for worker in self._workers:
+            worker.join()
+        for adapter in self._adapters.values():
+            adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
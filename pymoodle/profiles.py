@@ -0,0 +1,159 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+@dataclass(frozen=True)
+class LabelTable:
+    """Interface strings the parsers match against, for one language."""
+    completed: Tuple[str, ...]  # Completion icon title of a completed activity
+    not_completed: Tuple[str, ...]
+    submission_status: Tuple[str, ...]
+    grading_status: Tuple[str, ...]
+    due_date: Tuple[str, ...]
+    time_remaining: Tuple[str, ...]
+    last_modified: Tuple[str, ...]
+    file_submissions: Tuple[str, ...]
+    grade: Tuple[str, ...]
+    review: Tuple[str, ...]
+    feedback: Tuple[str, ...]
+    choose: Tuple[str, ...]  # Placeholder option of select questions
+    course_total: Tuple[str, ...]  # Course total row of the user grade report
+
+    def merged(self, other: 'LabelTable') -> 'LabelTable':
+        return LabelTable(**{
+            name: getattr(self, name) + tuple(v for v in getattr(other, name) if v not in getattr(self, name))
+            for name in self.__dataclass_fields__
+        })
+
+LABELS: Dict[str, LabelTable] = {
+    'ja': LabelTable(
+        completed=("完了: ",),
+        not_completed=("未完了",),
+        submission_status=("提出ステータス",),
+        grading_status=("評定ステータス",),
+        due_date=("終了日時",),
+        time_remaining=("残り時間",),
+        last_modified=("最終更新日時",),
+        file_submissions=("ファイル提出",),
+        grade=("評点", "素点"),
+        review=("レビュー",),
+        feedback=("フィードバック",),
+        choose=("選択",),
+        course_total=("コース合計",),
+    ),
+    'en': LabelTable(
+        completed=("Completed: ",),
+        not_completed=("Not completed",),
+        submission_status=("Submission status",),
+        grading_status=("Grading status",),
+        due_date=("Due date",),
+        time_remaining=("Time remaining",),
+        last_modified=("Last modified",),
+        file_submissions=("File submissions",),
+        grade=("Grade", "Marks"),
+        review=("Review",),
+        feedback=("Feedback",),
+        choose=("Choose",),
+        course_total=("Course total",),
+    ),
+}
+
+# 言語が分からない場合はすべての言語のラベルを試す
+ALL_LABELS = LABELS['ja'].merged(LABELS['en'])
+
+# 候補となるセレクタ (上から順に試す)
+COURSE_LIST_SELECTORS = ['.coursebox', 'div[data-region="course-content"]']
+GRADE_OVERVIEW_SELECTORS = ['table#overview-grade tbody tr', 'table.generaltable tbody tr']
+GRADE_REPORT_SELECTORS = ['table.user-grade tbody tr', 'table.generaltable tbody tr']
+SECTION_SELECTORS = [
+    'ul.topics li.section.main',
+    '.course-content ul.topics li.section.main',
+    '.course-content ul.weeks li.section.main',
+]
+
+# メジャーバージョンごとの候補。既定の候補より先に試す
+VERSION_SELECTORS: Dict[int, Dict[str, List[str]]] = {
+    3: {
+        'course_list': ['.coursebox'],
+    },
+    4: {
+        # 4.x のダッシュボードは .coursebox ではなくコース一覧の region を使う
+        'course_list': ['div[data-region="course-content"]'],
+        # 週・トピック以外の形式や 4.4 以降の course-section にも一致させる
+        'sections': ['.course-content li.section.main', 'li.section.course-section'],
+    },
+}
+
+# テーマごとの候補。バージョンごとの候補より先に試す
+THEME_SELECTORS: Dict[str, Dict[str, List[str]]] = {
+    # classic テーマは 4.x でも 3.x と同じ .coursebox の一覧を出す
+    'classic': {'course_list': ['.coursebox']},
+}
+
+@dataclass
+class SiteProfile:
+    """
+    What the parsers know about one Moodle site: its language, theme and major
+    version (detected from the first page), and which selectors matched there.
+    """
+    language: Optional[str] = None
+    theme: Optional[str] = None
+    major_version: Optional[int] = None
+    labels: LabelTable = ALL_LABELS
+    # 種類 ('course_list', 'sections', 'grades_overview', 'grade_report') -> このサイトで一致したセレクタ
+    selectors: Dict[str, str] = field(default_factory=dict)
+
+    def candidates(self, kind: str, defaults: List[str]) -> List[str]:
+        """
+        The selector that matched last time first, then the selectors for this
+        site's theme and version, then the remaining fallbacks.
+        """
+        known = self.selectors.get(kind)
+        preferred = (THEME_SELECTORS.get(self.theme or '', {}).get(kind, [])
+                     + VERSION_SELECTORS.get(self.major_version or 0, {}).get(kind, []))
+        return list(dict.fromkeys(([known] if known else []) + preferred + defaults))
+
+    def remember(self, kind: str, selector: str):
+        self.selectors[kind] = selector
+
+_LANG_RE = re.compile(r'<html[^>]*?\blang="([A-Za-z]+)', re.IGNORECASE)
+_THEME_RE = re.compile(r'"theme"\s*:\s*"(\w+)"')
+_MOODLE4_MARKERS = ('primary-navigation', 'data-region="moremenu"', 'core_courseformat')
+_MOODLE3_MARKERS = ('data-region="drawer"', 'block_navigation')
+
+def detect_profile(html: str) -> SiteProfile:
+    """Detects language, theme and major version from any page of a site."""
+    profile = SiteProfile()
+
+    match = _LANG_RE.search(html)
+    if match:
+        profile.language = match.group(1).lower()
+        if profile.language in LABELS:
+            # 対象言語を優先しつつ、他言語の表記が混在しても一致するようにする
+            profile.labels = LABELS[profile.language].merged(ALL_LABELS)
+
+    match = _THEME_RE.search(html)
+    if match:
+        profile.theme = match.group(1)
+
+    if any(marker in html for marker in _MOODLE4_MARKERS):
+        profile.major_version = 4
+    elif any(marker in html for marker in _MOODLE3_MARKERS):
+        profile.major_version = 3
+    return profile
+
+_profiles: Dict[str, SiteProfile] = {}
+_profiles_lock = threading.Lock()
+
+def profile_for(base_url: str, html: Optional[str] = None) -> Optional[SiteProfile]:
+    """
+    Returns the cached profile of a site, detecting it from ``html`` on first use.
+    Returns None if the site has no profile yet and no page was given.
+    """
+    with _profiles_lock:
+        profile = _profiles.get(base_url)
+        if profile is None and html is not None:
+            profile = detect_profile(html)
+            _profiles[base_url] = profile
+        return profile
@@ -0,0 +1,80 @@
+import logging
+from typing import Dict, Optional
+
+from pymoodle.api import MoodleAPI
+from pymoodle.types import QuizAttemptData
+
+logger = logging.getLogger(__name__)
+
+class QuizAttemptNavigator:
+    """
+    Walks through the pages of a quiz attempt.
+
+    Every move saves the current page and loads the target page in a single
+    POST/redirect cycle; the redirected page is parsed directly. The summary
+    page is only fetched when get_summary() is called.
+    """
+
+    def __init__(self, api: MoodleAPI, attempt_data: QuizAttemptData, cmid: Optional[int] = None):
+        self.api = api
+        self.current: Optional[QuizAttemptData] = attempt_data
+        self.cmid = cmid
+        self.attempt_id = attempt_data.attempt_id
+        self.sesskey = attempt_data.sesskey
+        self.summary_url = attempt_data.summary_url
+        self.last_url: Optional[str] = None
+
+    @classmethod
+    def open(cls, api: MoodleAPI, attempt_url: str, cmid: Optional[int] = None) -> Optional['QuizAttemptNavigator']:
+        attempt_data = api.get_quiz_attempt_data(attempt_url)
+        if attempt_data is None:
+            return None
+        return cls(api, attempt_data, cmid)
+
+    @property
+    def page(self) -> Optional[int]:
+        return self.current.this_page if self.current else None
+
+    @property
+    def is_last_page(self) -> bool:
+        return self.current is not None and self.current.next_page == -1
+
+    def go_to(self, page: int, answers: Optional[Dict[str, str]] = None) -> Optional[QuizAttemptData]:
+        """
+        Saves ``answers`` for the current page and moves to ``page`` (-1 for the summary).
+        Returns the new page, or None when it moved to the summary page or failed.
+        """
+        if self.current is None:
+            raise ValueError("Not on an attempt page")
+        url, data = self.api.navigate_quiz_attempt(self.current, answers or {}, page)
+        self.last_url = url
+        if data is not None:
+            self.current = data
+            self.summary_url = data.summary_url or self.summary_url
+        elif url is not None:
+            # サマリーページに移動した
+            self.current = None
+        return data
+
+    def next(self, answers: Optional[Dict[str, str]] = None) -> Optional[QuizAttemptData]:
+        """Saves the current page and goes to the next one (the summary after the last page)."""
+        return self.go_to(self.current.next_page if self.current else -1, answers)
+
+    def previous(self, answers: Optional[Dict[str, str]] = None) -> Optional[QuizAttemptData]:
+        if self.current is None:
+            raise ValueError("Not on an attempt page")
+        return self.go_to(max(self.current.this_page - 1, 0), answers)
+
+    def get_summary(self) -> Dict[str, str]:
+        if not self.summary_url:
+            return {}
+        return self.api.get_quiz_summary(self.summary_url)
+
+    def finish(self, answers: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Saves the current page (if any) and submits the attempt in one request.
+        Returns the URL of the review page.
+        """
+        cmid = str(self.cmid) if self.cmid is not None else ''
+        return self.api.finish_quiz_attempt(self.attempt_id, self.sesskey, cmid,
+                                            attempt_data=self.current, answers=answers)
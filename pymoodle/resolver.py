@@ -0,0 +1,137 @@
+import os
+import re
+import json
+import logging
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymoodle import utils
+from pymoodle.types import Module, ResolvedURL
+
+logger = logging.getLogger(__name__)
+
+_REVISION_RE = re.compile(r'/mod_resource/content/(\d+)/')
+
+def resource_revision(url: str) -> Optional[int]:
+    """Returns the revision number in a mod_resource pluginfile.php URL."""
+    match = _REVISION_RE.search(url)
+    return int(match.group(1)) if match else None
+
+class ModuleURLResolver:
+    """
+    Resolves resource and url modules to their final URLs in bulk.
+
+    Lookups run concurrently, and results are kept in a JSON cache
+    (``{"resource:123": {"url": ..., "revision": ...}}``) so that later runs
+    skip the resolution step. Use ``refresh=True`` or ``forget()`` after a
+    module has changed (for example when a CourseWatcher reports it).
+    """
+
+    KINDS = ('resource', 'url')
+
+    def __init__(self, api, cache_file: Optional[str] = None, max_workers: int = 8):
+        self.api = api
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._cache: Dict[str, ResolvedURL] = {}
+        self._dirty = False
+        if cache_file:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Failed to load URL cache: {e}")
+            return
+        for key, entry in data.items():
+            kind, _, module_id = key.partition(':')
+            self._cache[key] = ResolvedURL(kind=kind, module_id=int(module_id),
+                                           url=entry['url'], revision=entry.get('revision'))
+        logger.debug(f"Loaded {len(self._cache)} resolved URLs from {self.cache_file}")
+
+    def save(self):
+        """Writes the cache file (atomically) if anything changed."""
+        if not self.cache_file:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: {'url': r.url, 'revision': r.revision} for key, r in self._cache.items()}
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, kind: str, module_id: int) -> Optional[ResolvedURL]:
+        return self._cache.get(f"{kind}:{module_id}")
+
+    def forget(self, kind: str, module_id: int):
+        with self._lock:
+            if self._cache.pop(f"{kind}:{module_id}", None):
+                self._dirty = True
+
+    def resolve(self, resource_ids: Iterable[int] = (), url_ids: Iterable[int] = (),
+                refresh: bool = False) -> Dict[Tuple[str, int], ResolvedURL]:
+        """
+        Resolves the given module ids (cached entries are reused unless refresh=True)
+        and saves the cache. Modules that could not be resolved are left out.
+
+        :return: {(kind, module_id): ResolvedURL}
+        """
+        targets = [('resource', i) for i in resource_ids] + [('url', i) for i in url_ids]
+        results: Dict[Tuple[str, int], ResolvedURL] = {}
+        pending: List[Tuple[str, int]] = []
+        for kind, module_id in dict.fromkeys(targets):
+            cached = None if refresh else self.get(kind, module_id)
+            if cached:
+                results[(kind, module_id)] = cached
+            else:
+                pending.append((kind, module_id))
+
+        logger.info(f"Resolving {len(pending)} module URLs ({len(results)} cached)")
+        for target, resolved in zip(pending, utils.map_concurrently(self._resolve_one, pending, self.max_workers)):
+            if resolved:
+                results[target] = resolved
+
+        self.save()
+        return results
+
+    def resolve_modules(self, modules: Iterable[Module], refresh: bool = False) -> Dict[int, ResolvedURL]:
+        """Resolves the resource and url modules among ``modules``. Returns {module_id: ResolvedURL}."""
+        modules = [m for m in modules if m.id is not None and m.type in self.KINDS]
+        resolved = self.resolve(
+            resource_ids=[m.id for m in modules if m.type == 'resource'],
+            url_ids=[m.id for m in modules if m.type == 'url'],
+            refresh=refresh
+        )
+        return {module_id: r for (_, module_id), r in resolved.items()}
+
+    def _resolve_one(self, target: Tuple[str, int]) -> Optional[ResolvedURL]:
+        kind, module_id = target
+        if kind == 'resource':
+            url = self.api.get_resource_download_url(module_id)
+        else:
+            url = self.api.get_external_url(module_id)
+        if not url:
+            return None
+
+        resolved = ResolvedURL(kind=kind, module_id=module_id, url=url,
+                               revision=resource_revision(url) if kind == 'resource' else None)
+        with self._lock:
+            self._cache[f"{kind}:{module_id}"] = resolved
+            self._dirty = True
+        return resolved
@@ -3,10 +3,12 @@ import json
 import os
 import logging
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 from pymoodle.exceptions import MoodleLoginError, MoodleRequestError
+from pymoodle.types import Validator
+from pymoodle.singleflight import SingleFlight, normalize_url
+from pymoodle.streaming import LoginTokenFinder, scan_response
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,9 @@ class MoodleSession:
             base_url += '/'
         self.base_url = base_url
         self.login_url = urljoin(self.base_url, "login/index.php")
+        # 同じ URL への同時 GET を 1 リクエストにまとめる
+        self.coalesce = True
+        self._flights = SingleFlight()
 
         # Default headers
         self.session.headers.update({
@@ -31,11 +36,67 @@ class MoodleSession:
         })
 
     def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET request. Concurrent GETs for the same normalized URL (and the same
+        params / headers / redirect setting) share one request and one Response.
+        Streaming requests are never coalesced.
+        """
+        key = self._coalesce_key(url, kwargs)
+        if key is None:
+            return self._get(url, **kwargs)
+        return self._flights.do(key, lambda: self._get(url, **kwargs))
+
+    async def get_async(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET from asyncio code. The request runs in the default executor, and
+        concurrent awaits for the same URL share it.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        key = self._coalesce_key(url, kwargs)
+        if key is None:
+            return await loop.run_in_executor(None, lambda: self._get(url, **kwargs))
+        return await self._flights.do_async(key, lambda: loop.run_in_executor(None, lambda: self._get(url, **kwargs)))
+
+    def _coalesce_key(self, url: str, kwargs: Dict[str, Any]) -> Optional[tuple]:
+        if not self.coalesce or kwargs.get('stream') or set(kwargs) - {'params', 'headers', 'allow_redirects', 'timeout'}:
+            return None
+        headers = tuple(sorted((k.lower(), v) for k, v in (kwargs.get('headers') or {}).items()))
+        return (normalize_url(url, kwargs.get('params')), headers, kwargs.get('allow_redirects', True))
+
+    def coalescing_stats(self) -> Dict[str, int]:
+        """Returns {'hits', 'misses', 'in_flight'}: hits are requests saved by coalescing."""
+        return self._flights.stats()
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
         try:
             return self.session.get(url, **kwargs)
         except requests.RequestException as e:
             raise MoodleRequestError(f"GET request failed: {e}") from e
 
+    def conditional_get(self, url: str, validator: Optional[Validator] = None, **kwargs) -> Tuple[Optional[requests.Response], Validator]:
+        """
+        GET with If-None-Match / If-Modified-Since taken from a previous response.
+
+        :return: (None, validator) if the server answered 304 Not Modified,
+                 otherwise the response and its new validator.
+        """
+        headers = dict(kwargs.pop('headers', None) or {})
+        if validator:
+            if validator.etag:
+                headers['If-None-Match'] = validator.etag
+            if validator.last_modified:
+                headers['If-Modified-Since'] = validator.last_modified
+
+        response = self.get(url, headers=headers, **kwargs)
+        if response.status_code == 304 and validator:
+            return None, validator
+        response.raise_for_status()
+        return response, Validator(
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+
     def post(self, url: str, **kwargs) -> requests.Response:
         try:
             return self.session.post(url, **kwargs)
@@ -48,22 +109,26 @@ class MoodleSession:
         """
         logger.info(f"Fetching login page: {self.login_url}")
         try:
-            response = self.get(self.login_url)
+            response = self.get(self.login_url, stream=True)
             response.raise_for_status()
         except (MoodleRequestError, requests.HTTPError) as e:
+            if isinstance(e, requests.HTTPError):
+                e.response.close()
             logger.error(f"Error fetching login page: {e}")
             raise MoodleLoginError(f"Could not access login page: {e}")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        login_token_input = soup.find('input', {'name': 'logintoken'})
+        # logintoken はフォームの先頭にあるので、見つかった時点で読み込みを打ち切る
+        finder = LoginTokenFinder()
+        with response:
+            scan_response(response, finder)
 
         payload = {
             'username': username,
             'password': password,
         }
 
-        if login_token_input:
-            token = login_token_input.get('value')
+        if finder.token:
+            token = finder.token
             payload['logintoken'] = token
             logger.debug(f"Login token found: {token}")
         else:
@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+T = TypeVar('T')
+
+def normalize_url(url: str, params: Any = None) -> str:
+    """
+    Canonical form of a URL for request coalescing: lower-case scheme and host,
+    no default port or fragment, and query parameters (including ``params``) sorted.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, parts.port) in (("http", 80), ("https", 443)):
+        netloc = netloc.rsplit(':', 1)[0]
+
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        items = params.items() if hasattr(params, 'items') else params
+        for key, value in items:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            query.extend((str(key), str(v)) for v in values)
+    return urlunsplit((scheme, netloc, parts.path or '/', urlencode(sorted(query)), ''))
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    While a call for a key is in flight, other callers with that key wait for it
+    and receive the same result (or exception). Nothing is cached once the call
+    finishes. ``hits`` counts callers that joined an in-flight call, ``misses``
+    counts calls that were actually executed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._async_calls: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.hits += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._calls[key] = future
+                leader = True
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Async variant; coalesces awaiting callers on the running event loop."""
+        # asyncio はこのメソッドを使うときだけ読み込む
+        import asyncio
+        loop = asyncio.get_running_loop()
+        scoped_key = (id(loop), key)
+        with self._lock:
+            future = self._async_calls.get(scoped_key)
+            if future is not None:
+                self.hits += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = loop.create_future()
+                self._async_calls[scoped_key] = future
+                leader = True
+        if not leader:
+            # 待機側がキャンセルされても実行中の呼び出しは止めない
+            return await asyncio.shield(future)
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 待機者がいない場合の "exception was never retrieved" 警告を抑止
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop(scoped_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'in_flight': len(self._calls) + len(self._async_calls)}
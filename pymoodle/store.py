@@ -0,0 +1,208 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import logging
+from dataclasses import dataclass
+from urllib.parse import urlparse, parse_qs, unquote
+from typing import Callable, Dict, Iterable, Optional
+
+from pymoodle import utils
+
+logger = logging.getLogger(__name__)
+
+# Linux の FICLONE ioctl (btrfs / XFS / bcachefs などでリフリンクを作成する)
+FICLONE = 0x40049409
+
+@dataclass
+class StoreEntry:
+    digest: str
+    filename: str
+    size: int
+
+def pluginfile_key(url: str) -> Optional[str]:
+    """
+    Returns a stable index key for a pluginfile.php URL, or None for other URLs.
+
+    The key is the file path after pluginfile.php
+    (contextid/component/filearea/itemid-or-revision/filepath/filename),
+    so query parameters such as ``forcedownload`` do not create new entries.
+    """
+    parsed = urlparse(url)
+    path = unquote(parsed.path)
+    marker = "pluginfile.php"
+    idx = path.find(marker)
+    if idx == -1:
+        return None
+
+    rest = path[idx + len(marker):]
+    if not rest.strip('/'):
+        # slasharguments が無効なサイトでは ?file=/... 形式になる
+        rest = parse_qs(parsed.query).get('file', [''])[0]
+
+    rest = rest.strip('/')
+    if rest.count('/') < 3:
+        return None
+    return f"{parsed.netloc}/{rest}"
+
+class ContentStore:
+    """
+    Content-addressable store for downloaded files.
+
+    Files are stored once under ``objects/`` by SHA-256 and linked into their
+    destination paths. A URL index (``index.jsonl``) maps pluginfile.php paths
+    to digests so repeated downloads of the same file skip the network.
+
+    Hardlinked copies share data with the store, so they should be treated as
+    read-only. Use ``link_mode="copy"`` if the destination files will be edited.
+    """
+
+    def __init__(self, root: str, link_mode: str = "auto"):
+        if link_mode not in ("auto", "reflink", "hardlink", "copy"):
+            raise ValueError(f"Unknown link mode: {link_mode}")
+        self.root = root
+        self.link_mode = link_mode
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_file = os.path.join(root, "index.jsonl")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index: Dict[str, StoreEntry] = {}
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._index[record['key']] = StoreEntry(
+                        digest=record['digest'],
+                        filename=record['filename'],
+                        size=record['size']
+                    )
+                except (json.JSONDecodeError, KeyError):
+                    # 書き込み途中で中断された行は無視する
+                    continue
+        logger.debug(f"Loaded {len(self._index)} entries from {self.index_file}")
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def has_object(self, digest: str) -> bool:
+        return os.path.exists(self.object_path(digest))
+
+    def lookup(self, url: str) -> Optional[StoreEntry]:
+        """Returns the stored entry for a URL if its content is already in the store."""
+        key = pluginfile_key(url)
+        if key is None:
+            return None
+        entry = self._index.get(key)
+        if entry and self.has_object(entry.digest):
+            return entry
+        return None
+
+    def remember(self, url: str, entry: StoreEntry):
+        """Records the URL -> digest mapping (only for pluginfile.php URLs)."""
+        key = pluginfile_key(url)
+        if key is None:
+            return
+        with self._lock:
+            if self._index.get(key) == entry:
+                return
+            self._index[key] = entry
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({
+                    'key': key,
+                    'digest': entry.digest,
+                    'filename': entry.filename,
+                    'size': entry.size
+                }, ensure_ascii=False) + "\n")
+
+    def ingest(self, chunks: Iterable[bytes]) -> str:
+        """
+        Writes a stream of chunks into the store, hashing as it goes.
+        Returns the SHA-256 digest of the content.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        hasher = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        hasher.update(chunk)
+                        f.write(chunk)
+            digest = hasher.hexdigest()
+            self._commit(tmp_path, digest)
+            return digest
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def ingest_reader(self, readinto: Callable[[memoryview], int], size: Optional[int] = None,
+                      progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                      throttle: Optional[Callable[[int], None]] = None) -> str:
+        """
+        Like ingest(), but reads with readinto() into a reused buffer (see utils.copy_readinto).
+        Returns the SHA-256 digest of the content.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        hasher = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                utils.copy_readinto(readinto, f, size=size, hasher=hasher, progress=progress, throttle=throttle)
+            digest = hasher.hexdigest()
+            self._commit(tmp_path, digest)
+            return digest
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _commit(self, tmp_path: str, digest: str):
+        target = self.object_path(digest)
+        if os.path.exists(target):
+            # 同じ内容が既に保存されている
+            os.remove(tmp_path)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+
+    def link(self, digest: str, dest: str):
+        """Materializes a stored object at ``dest`` (reflink, hardlink, then copy)."""
+        source = self.object_path(digest)
+        if os.path.exists(dest):
+            if os.path.samefile(source, dest):
+                return
+            os.remove(dest)
+
+        if self.link_mode in ("auto", "reflink") and self._reflink(source, dest):
+            return
+        if self.link_mode in ("auto", "hardlink"):
+            try:
+                os.link(source, dest)
+                return
+            except OSError as e:
+                logger.debug(f"Hardlink failed ({e}), falling back to copy")
+        shutil.copyfile(source, dest)
+
+    @staticmethod
+    def _reflink(source: str, dest: str) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            return False
+        try:
+            with open(source, 'rb') as src, open(dest, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError:
+            if os.path.exists(dest):
+                os.remove(dest)
+            return False
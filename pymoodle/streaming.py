@@ -0,0 +1,158 @@
+import codecs
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+class FragmentFinder(HTMLParser):
+    """
+    Incremental HTML scanner that looks for a few elements and sets ``done``
+    once it has what it needs. Feed it with ``scan_response``.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if not self.done:
+            self.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if not self.done:
+            self.start(tag, dict(attrs))
+            self.end(tag)
+
+    def handle_endtag(self, tag: str):
+        if not self.done:
+            self.end(tag)
+
+    def start(self, tag: str, attrs: Dict[str, Optional[str]]):
+        pass
+
+    def end(self, tag: str):
+        pass
+
+class _ClassTracker(FragmentFinder):
+    """Tracks whether the scanner is inside an element with one of the given classes."""
+
+    tracked_classes: Tuple[str, ...] = ()
+
+    def __init__(self):
+        super().__init__()
+        # (タグ名, クラス) のスタック。void 要素は積まない
+        self._open: List[Tuple[str, Optional[str]]] = []
+
+    def inside(self, cls: str) -> bool:
+        return any(c == cls for _, c in self._open)
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        tracked = next((c for c in self.tracked_classes if c in classes), None)
+        if tag not in _VOID_TAGS and (tracked or self._open):
+            self._open.append((tag, tracked))
+        self.start(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        # 閉じ忘れのタグがあっても対応する要素まで戻す
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i][0] == tag:
+                del self._open[i:]
+                break
+        self.end(tag)
+
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+class LoginTokenFinder(FragmentFinder):
+    """Finds ``<input name="logintoken">`` on the login page."""
+
+    def __init__(self):
+        super().__init__()
+        self.token: Optional[str] = None
+
+    def start(self, tag, attrs):
+        if tag == 'input' and attrs.get('name') == 'logintoken':
+            self.token = attrs.get('value')
+            self.done = True
+
+class ResourceLinkFinder(_ClassTracker):
+    """
+    Finds the file link on a resource view page that did not redirect
+    (.resourcecontent link, embedded iframe/object, or the .resourceworkaround link).
+    """
+
+    tracked_classes = ('resourcecontent', 'resourceworkaround')
+
+    def __init__(self):
+        super().__init__()
+        self.url: Optional[str] = None
+
+    def start(self, tag, attrs):
+        classes = (attrs.get('class') or '').split()
+        if tag == 'a' and attrs.get('href') and (self.inside('resourcecontent') or self.inside('resourceworkaround')):
+            self.url = attrs['href']
+        elif tag == 'iframe' and 'resourceembed' in classes and attrs.get('src'):
+            self.url = attrs['src']
+        elif tag == 'object' and 'resourceembed' in classes and attrs.get('data'):
+            self.url = attrs['data']
+        if self.url:
+            self.done = True
+
+class QuizStartFinder(FragmentFinder):
+    """Finds the startattempt.php form (cmid and sesskey) on a quiz view page."""
+
+    def __init__(self):
+        super().__init__()
+        self.found = False
+        self.cmid: Optional[int] = None
+        self.sesskey: Optional[str] = None
+        self._in_form = False
+
+    def start(self, tag, attrs):
+        if tag == 'form' and 'startattempt.php' in (attrs.get('action') or ''):
+            self.found = True
+            self._in_form = True
+        elif tag == 'input' and self._in_form:
+            if attrs.get('name') == 'cmid':
+                try:
+                    self.cmid = int(attrs.get('value'))
+                except (TypeError, ValueError):
+                    pass
+            elif attrs.get('name') == 'sesskey':
+                self.sesskey = attrs.get('value')
+
+    def end(self, tag):
+        if tag == 'form' and self._in_form:
+            self._in_form = False
+            self.done = True
+
+def scan_response(response, finder: FragmentFinder, chunk_size: int = STREAM_CHUNK_SIZE) -> Optional[str]:
+    """
+    Feeds a streamed response into a finder until it is done, then closes the
+    connection without reading the rest of the body.
+
+    :param response: A response fetched with ``stream=True``.
+    :return: None if the finder stopped early, otherwise the complete decoded
+             body (so callers can fall back to a full parse).
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    text_parts: List[str] = []
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            text = decoder.decode(chunk)
+            text_parts.append(text)
+            finder.feed(text)
+            if finder.done:
+                return None
+        text = decoder.decode(b'', final=True)
+        text_parts.append(text)
+        finder.feed(text)
+        finder.close()
+        return None if finder.done else ''.join(text_parts)
+    finally:
+        response.close()
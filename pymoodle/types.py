@@ -1,6 +1,13 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 
+@dataclass
+class Validator:
+    """HTTP cache validators used for conditional requests."""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
 @dataclass
 class Course:
     id: int
@@ -17,6 +24,18 @@ class Category:
     course_count: int
     has_children: bool
 
+@dataclass
+class CategoryNode:
+    category: Category
+    depth: int
+    children: List['CategoryNode'] = field(default_factory=list)
+    courses: List[Course] = field(default_factory=list)
+
+    @property
+    def total_course_count(self) -> int:
+        """Number of courses in this category and all crawled subcategories."""
+        return self.category.course_count + sum(c.total_course_count for c in self.children)
+
 @dataclass
 class Module:
     id: Optional[int]
@@ -33,6 +52,16 @@ class Section:
     summary: str
     modules: List[Module]
 
+@dataclass
+class SectionInfo:
+    """A section as listed by the course index, without its module details."""
+    number: int  # Position in the course (the ``section`` URL parameter)
+    id: Optional[int]  # Database id (None when listed from the course page)
+    name: str
+    url: Optional[str]
+    module_ids: List[int] = field(default_factory=list)
+    visible: bool = True
+
 @dataclass
 class FileItem:
     filename: str
@@ -50,6 +79,15 @@ class AssignmentDetails:
     time_remaining: str
     last_modified: str
     submission_files: List[FileItem]
+    intro_html: str = ""  # Raw HTML of the intro (may reference pluginfile.php assets)
+
+@dataclass
+class AssignmentDeadline:
+    course: Course
+    module: Module
+    details: AssignmentDetails
+    due_at: Optional[datetime]  # Timezone-aware
+    time_remaining: Optional[timedelta]  # Negative when overdue
 
 @dataclass
 class FolderDetails:
@@ -62,6 +100,31 @@ class ForumDetails:
     title: str
     intro: str
     has_discussions: bool
+    intro_html: str = ""
+
+@dataclass
+class ForumDiscussion:
+    id: int
+    subject: str
+    url: str
+    author: Optional[str]
+    replies: Optional[int]
+    last_post: Optional[str]  # As displayed (author / date)
+    last_post_id: Optional[int]
+
+    @property
+    def change_key(self) -> str:
+        """Changes whenever a new post is added to the discussion."""
+        return f"{self.last_post_id}|{self.replies}|{self.last_post}"
+
+@dataclass
+class ForumPost:
+    id: Optional[int]
+    discussion_id: int
+    subject: str
+    author: Optional[str]
+    time: Optional[str]
+    content: str  # HTML
 
 @dataclass
 class PageDetails:
@@ -93,7 +156,31 @@ class QuizAttemptData:
     sesskey: str
     slots: str
     questions: List[QuizQuestion]
-    next_url: Optional[str]
+    next_url: Optional[str]  # Next page, or the summary page on the last page
+    this_page: int = 0
+    next_page: int = -1  # -1 on the last page
+    page_count: int = 1
+    page_urls: Dict[int, str] = field(default_factory=dict)  # From the quiz navigation block
+    summary_url: Optional[str] = None
+
+@dataclass
+class QuizReviewQuestion:
+    id: str
+    number: int
+    type: str
+    text: str
+    state: str
+    marks: Optional[str]
+    response: List[str]  # Selected choices / entered values
+    right_answer: Optional[str]
+    feedback: Optional[str]
+
+@dataclass
+class QuizReview:
+    attempt_id: Optional[str]
+    summary: Dict[str, str]  # Rows of the review summary table (state, grade, ...)
+    questions: List[QuizReviewQuestion]
+    review_url: Optional[str] = None
 
 @dataclass
 class QuizDetails:
@@ -105,3 +192,135 @@ class QuizDetails:
     cmid: Optional[int]
     sesskey: Optional[str]
     latest_attempt_data: Optional[QuizAttemptData]
+    intro_html: str = ""
+
+@dataclass
+class CourseChange:
+    """Base class for change events emitted by pymoodle.diff."""
+    course_id: int
+    module_id: int
+
+@dataclass
+class ModuleAdded(CourseChange):
+    section_id: Optional[str]
+    module: Module
+
+@dataclass
+class ModuleRemoved(CourseChange):
+    section_id: Optional[str]
+    name: str
+
+@dataclass
+class ModuleRenamed(CourseChange):
+    old_name: str
+    new_name: str
+
+@dataclass
+class ModuleMoved(CourseChange):
+    old_section_id: Optional[str]
+    new_section_id: Optional[str]
+
+@dataclass
+class CompletionChanged(CourseChange):
+    completed: bool
+
+@dataclass
+class DescriptionChanged(CourseChange):
+    description: Optional[str]
+
+@dataclass
+class WatchEvent:
+    kind: str  # 'course', 'assignment' or 'quiz'
+    item_id: int
+    changes: List[CourseChange]  # For courses
+    details: Optional[Any] = None  # New AssignmentDetails / QuizDetails
+
+@dataclass
+class SearchHit:
+    kind: str  # 'course', 'module', 'file', 'page', 'assignment' or 'forum'
+    title: str
+    snippet: str
+    score: float
+    course: Optional[Course] = None
+    module: Optional[Module] = None
+    file: Optional[FileItem] = None
+
+@dataclass
+class ResolvedURL:
+    kind: str  # 'resource' or 'url'
+    module_id: int
+    url: str  # Final file / external URL
+    revision: Optional[int] = None  # Revision number from the pluginfile.php path (resources only)
+
+@dataclass
+class CrawlSummary:
+    counts: Dict[str, Dict[str, int]]  # {kind: {status: count}}
+    failed: List[Dict[str, Any]]  # [{'key', 'kind', 'attempts', 'error'}]
+    elapsed: float  # Seconds spent in this run
+    finished: bool  # True when no pending items remain
+
+    @property
+    def total_done(self) -> int:
+        return sum(statuses.get('done', 0) for statuses in self.counts.values())
+
+@dataclass
+class TenantMetrics:
+    base_url: str
+    account: str
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    queued: int = 0  # Tasks waiting for a slot
+    running: int = 0
+    requests: int = 0  # HTTP responses received
+    http_errors: int = 0  # Responses with status >= 400
+    wait_time: float = 0.0  # Total seconds tasks spent queued
+    run_time: float = 0.0  # Total seconds tasks spent running
+
+@dataclass
+class DownloadStats:
+    queued: int
+    active: int
+    completed: int
+    failed: int
+    bytes_done: int  # Bytes transferred so far (all jobs)
+    bytes_remaining: Optional[int]  # None if a pending job has no size hint
+    throughput: float  # Bytes per second over the recent window
+    eta: Optional[float]  # Seconds, None when unknown
+
+@dataclass
+class HydratedModule:
+    module: Module
+    # AssignmentDetails / QuizDetails / FolderDetails / PageDetails / ForumDetails,
+    # or ResolvedURL for resources and URLs
+    details: Optional[Any] = None
+    error: Optional[str] = None  # Why the details could not be fetched
+
+@dataclass
+class HydratedCourse:
+    course_id: int
+    sections: List[Section]
+    modules: Dict[int, HydratedModule]  # Module id -> details, for the requested types
+
+@dataclass
+class CourseGrade:
+    """One row of the grades overview report."""
+    course_id: Optional[int]
+    course_name: str
+    grade: str  # As shown (for example "85.00" or "-")
+    rank: Optional[str] = None  # Only when the site shows ranks
+    url: Optional[str] = None  # The course's user report
+
+@dataclass
+class GradeItem:
+    """One row of a course's user grade report."""
+    name: str
+    item_type: str  # Module type ('assign', 'quiz', ...), 'category', or 'course' for the course total
+    module_id: Optional[int] = None
+    weight: str = ""
+    grade: str = ""
+    range: str = ""
+    percentage: str = ""
+    letter: str = ""
+    feedback: str = ""
+    contribution: str = ""  # Contribution to course total
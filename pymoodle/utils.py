@@ -1,7 +1,18 @@
 import os
 import re
+import time
+from datetime import datetime, timedelta, tzinfo
+from functools import lru_cache
 from urllib.parse import unquote, urlparse
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Pattern, TypeVar
+
+from pymoodle.exceptions import MoodleRequestError
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
 
 def extract_filename_from_response(response, url: str) -> str:
     """
@@ -29,3 +40,173 @@ def extract_filename_from_response(response, url: str) -> str:
         filename = "downloaded_file"
 
     return filename
+
+def response_content_length(response) -> Optional[int]:
+    """
+    Returns the number of bytes the body will decode to, or None if unknown
+    (no Content-Length, or a Content-Encoding that changes the size).
+    """
+    if response.headers.get("Content-Encoding", "identity").lower() != "identity":
+        return None
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+def preallocate(f: BinaryIO, size: int):
+    """Reserves disk space for a file of the given size (best effort, posix_fallocate only)."""
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError:
+        # tmpfs の一部や NFS などでは未対応
+        pass
+
+def copy_readinto(readinto: Callable[[memoryview], int], f: BinaryIO, size: Optional[int] = None,
+                  hasher: Any = None, progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                  buffer_size: int = DOWNLOAD_BUFFER_SIZE, progress_interval: float = 0.5,
+                  throttle: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Copies a stream into f through a single reused buffer.
+
+    :param readinto: Function that fills a memoryview and returns the byte count (0 at EOF),
+                     e.g. ``response.raw.readinto``.
+    :param size: Expected size. The file is preallocated, and MoodleRequestError is raised
+                 if the stream ends before size bytes (a dropped connection).
+    :param hasher: hashlib object updated with every block.
+    :param progress: Called as progress(written, size) at most every progress_interval seconds, and once at the end.
+    :param throttle: Called with the size of every block; may sleep to cap bandwidth.
+    :return: Number of bytes written.
+    """
+    if size:
+        preallocate(f, size)
+
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    written = 0
+    last_report = time.monotonic()
+    while True:
+        n = readinto(view)
+        if not n:
+            break
+        block = view[:n]
+        f.write(block)
+        if hasher is not None:
+            hasher.update(block)
+        written += n
+        if throttle is not None:
+            throttle(n)
+        if progress is not None:
+            now = time.monotonic()
+            if now - last_report >= progress_interval:
+                last_report = now
+                progress(written, size)
+
+    if size and written < size:
+        # 途中で切れた本文をそのまま保存・索引しない
+        raise MoodleRequestError(f"Download incomplete: got {written} of {size} bytes")
+    if progress is not None:
+        progress(written, size)
+    return written
+
+def map_concurrently(func: Callable[[T], R], items: Iterable[T], max_workers: int = 8) -> List[R]:
+    """
+    Calls func for every item on a thread pool and returns the results in input order.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+_MONTHS = {name: i + 1 for i, name in enumerate(
+    ["january", "february", "march", "april", "may", "june", "july",
+     "august", "september", "october", "november", "december"])}
+
+# Moodle の strftimedatetime 形式 (言語ごと)
+_DATETIME_PATTERNS: Dict[str, Pattern] = {
+    # 2024年 1月 15日(月曜日) 23:59
+    'ja': re.compile(r'(?P<year>\d{4})年\s*(?P<month>\d{1,2})月\s*(?P<day>\d{1,2})日(?:\s*\([^)]*\))?\s*(?P<hour>\d{1,2}):(?P<minute>\d{2})'),
+    # Monday, 15 January 2024, 11:59 PM
+    'en': re.compile(r'(?P<day>\d{1,2})\s+(?P<month>[A-Za-z]+)\s+(?P<year>\d{4}),?\s+(?P<hour>\d{1,2}):(?P<minute>\d{2})\s*(?P<ampm>[AaPp][Mm])?'),
+}
+
+_DURATION_UNITS: Dict[str, List[tuple]] = {
+    'ja': [(re.compile(r'(\d+)\s*日'), 'days'), (re.compile(r'(\d+)\s*時間'), 'hours'),
+           (re.compile(r'(\d+)\s*分'), 'minutes'), (re.compile(r'(\d+)\s*秒'), 'seconds')],
+    'en': [(re.compile(r'(\d+)\s*days?\b'), 'days'), (re.compile(r'(\d+)\s*hours?\b'), 'hours'),
+           (re.compile(r'(\d+)\s*min(?:ute)?s?\b'), 'minutes'), (re.compile(r'(\d+)\s*sec(?:ond)?s?\b'), 'seconds')],
+}
+
+_OVERDUE_MARKERS = ("過ぎ", "超過", "overdue", "late")
+
+# 直前に一致した言語のパターンから試す
+_last_locale = ['ja']
+
+def _locales_in_order() -> List[str]:
+    first = _last_locale[0]
+    return [first] + [locale for locale in _DATETIME_PATTERNS if locale != first]
+
+@lru_cache(maxsize=4096)
+def _parse_datetime_fields(text: str) -> Optional[tuple]:
+    for locale in _locales_in_order():
+        match = _DATETIME_PATTERNS[locale].search(text)
+        if not match:
+            continue
+        month = match.group('month')
+        if month.isdigit():
+            month_num = int(month)
+        else:
+            month_num = _MONTHS.get(month.lower())
+            if month_num is None:
+                continue
+        hour = int(match.group('hour'))
+        ampm = match.groupdict().get('ampm')
+        if ampm:
+            hour = hour % 12 + (12 if ampm.lower() == 'pm' else 0)
+        _last_locale[0] = locale
+        return (int(match.group('year')), month_num, int(match.group('day')), hour, int(match.group('minute')))
+    return None
+
+def parse_moodle_datetime(text: str, tz: Optional[tzinfo] = None) -> Optional[datetime]:
+    """
+    Parses a date as displayed by Moodle (Japanese or English) into an aware datetime.
+
+    :param tz: Timezone the page was rendered in (the user's Moodle timezone).
+               Defaults to the local timezone.
+    """
+    if not text:
+        return None
+    fields = _parse_datetime_fields(text.strip())
+    if fields is None:
+        return None
+    try:
+        if tz is not None:
+            return datetime(*fields, tzinfo=tz)
+        # その日時でのローカルのオフセットを使う (現在のオフセットだと夏時間をまたぐと 1 時間ずれる)
+        return datetime(*fields).astimezone()
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=4096)
+def parse_moodle_duration(text: str) -> Optional[timedelta]:
+    """
+    Parses a duration such as '2 日 3 時間' or '1 day 4 hours'.
+    Overdue durations ('...過ぎています: 1 日', 'overdue by: 1 day') are negative.
+    """
+    if not text:
+        return None
+    for locale in _locales_in_order():
+        parts = {}
+        for pattern, unit in _DURATION_UNITS[locale]:
+            match = pattern.search(text)
+            if match:
+                parts[unit] = int(match.group(1))
+        if parts:
+            delta = timedelta(**parts)
+            lowered = text.lower()
+            if any(marker in lowered for marker in _OVERDUE_MARKERS):
+                delta = -delta
+            return delta
+    return None
@@ -0,0 +1,220 @@
+import time
+import heapq
+import asyncio
+import logging
+import threading
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pymoodle import parsers, diff, utils
+from pymoodle.api import MoodleAPI
+from pymoodle.types import Validator, WatchEvent
+from pymoodle.exceptions import MoodleRequestError
+
+logger = logging.getLogger(__name__)
+
+_PATHS = {
+    'course': "course/view.php?id={}",
+    'assignment': "mod/assign/view.php?id={}",
+    'quiz': "mod/quiz/view.php?id={}",
+}
+
+@dataclass
+class WatchTarget:
+    kind: str
+    item_id: int
+    interval: float
+    next_poll: float = 0.0
+    due_at: Optional[datetime] = None
+    validator: Optional[Validator] = None
+    state: Any = None
+    polls: int = 0
+    changes: int = 0
+    errors: int = 0
+    entry_seq: int = -1  # 現在有効なキューエントリの seq (古いエントリは読み飛ばす)
+
+@dataclass(order=True)
+class _Entry:
+    next_poll: float
+    seq: int
+    key: Tuple[str, int] = field(compare=False)
+
+def _watched_fields(kind: str, details) -> tuple:
+    """
+    The part of assignment / quiz details that counts as a change. Countdowns
+    such as time_remaining differ on every poll and are left out.
+    """
+    if kind == 'assignment':
+        files = tuple((f.filename, f.url) for f in list(details.attachments) + list(details.submission_files))
+        return (details.submission_status, details.grading_status, details.due_date, details.last_modified, files)
+    return (details.title, details.intro, details.attempts, details.feedback, details.can_attempt)
+
+class CourseWatcher:
+    """
+    Polls course pages, assignments and quizzes on individual, adaptive schedules.
+
+    Each target's interval shrinks when it changes and grows while it stays the
+    same (between min_interval and max_interval). Assignments are polled more
+    often as their due date approaches. Requests are conditional where the
+    server supports it, and at most max_concurrency polls run at once.
+
+    Changes are delivered to callbacks registered with on_change(), returned
+    from poll_due(), or consumed with ``async for event in watcher.events()``.
+    """
+
+    def __init__(self, api: MoodleAPI, max_concurrency: int = 4,
+                 min_interval: float = 60.0, max_interval: float = 6 * 3600.0,
+                 initial_interval: float = 300.0):
+        self.api = api
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+
+        self.targets: Dict[Tuple[str, int], WatchTarget] = {}
+        self._queue: List[_Entry] = []
+        self._seq = itertools.count()
+        self._callbacks: List[Callable[[WatchEvent], None]] = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def watch_course(self, course_id: int):
+        self._add('course', course_id)
+
+    def watch_assignment(self, assign_id: int, due_at: Optional[datetime] = None):
+        """
+        :param due_at: Due date (timezone-aware). Polling tightens as it approaches.
+                       If omitted, it is read from the assignment page.
+        """
+        self._add('assignment', assign_id, due_at)
+
+    def watch_quiz(self, quiz_id: int):
+        self._add('quiz', quiz_id)
+
+    def unwatch(self, kind: str, item_id: int):
+        with self._lock:
+            self.targets.pop((kind, item_id), None)
+
+    def on_change(self, callback: Callable[[WatchEvent], None]):
+        self._callbacks.append(callback)
+
+    def _add(self, kind: str, item_id: int, due_at: Optional[datetime] = None):
+        with self._lock:
+            if (kind, item_id) in self.targets:
+                return
+            target = WatchTarget(kind=kind, item_id=item_id, interval=self.initial_interval,
+                                 next_poll=time.monotonic(), due_at=due_at)
+            self.targets[(kind, item_id)] = target
+            self._push(target)
+
+    def _push(self, target: WatchTarget):
+        target.entry_seq = next(self._seq)
+        heapq.heappush(self._queue, _Entry(target.next_poll, target.entry_seq, (target.kind, target.item_id)))
+
+    def seconds_until_next_poll(self) -> Optional[float]:
+        with self._lock:
+            if not self._queue:
+                return None
+            return max(0.0, self._queue[0].next_poll - time.monotonic())
+
+    def poll_due(self) -> List[WatchEvent]:
+        """Polls every target whose time has come and returns the change events."""
+        now = time.monotonic()
+        due: List[WatchTarget] = []
+        with self._lock:
+            while self._queue and self._queue[0].next_poll <= now:
+                entry = heapq.heappop(self._queue)
+                target = self.targets.get(entry.key)
+                # unwatch 後に再登録された対象の古いエントリは捨てる
+                if target is not None and target.entry_seq == entry.seq:
+                    due.append(target)
+
+        events: List[WatchEvent] = []
+        for target, event in zip(due, self._executor.map(self._poll, due)):
+            self._reschedule(target, changed=event is not None)
+            if event is not None:
+                events.append(event)
+
+        for event in events:
+            for callback in self._callbacks:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Watch callback failed: {e}")
+        return events
+
+    def run(self, stop: Optional[threading.Event] = None):
+        """Polls in the current thread until ``stop`` is set."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.poll_due()
+            wait = self.seconds_until_next_poll()
+            stop.wait(self.min_interval if wait is None else wait)
+
+    async def events(self) -> AsyncIterator[WatchEvent]:
+        """Async iterator over change events. Polling runs in the watcher's thread pool."""
+        loop = asyncio.get_running_loop()
+        while True:
+            wait = self.seconds_until_next_poll()
+            await asyncio.sleep(self.min_interval if wait is None else wait)
+            for event in await loop.run_in_executor(None, self.poll_due):
+                yield event
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _poll(self, target: WatchTarget) -> Optional[WatchEvent]:
+        url = urljoin(self.api.session.base_url, _PATHS[target.kind].format(target.item_id))
+        target.polls += 1
+        try:
+            response, target.validator = self.api.session.conditional_get(url, target.validator)
+            if response is None:
+                logger.debug(f"Not modified: {url}")
+                return None
+
+            if target.kind == 'course':
+                snapshot = diff.take_snapshot(target.item_id, response.text, target.state)
+                changes = diff.diff_snapshots(target.state, snapshot) if target.state else []
+                target.state = snapshot
+                if changes:
+                    return WatchEvent(kind='course', item_id=target.item_id, changes=changes)
+                return None
+
+            if target.kind == 'assignment':
+                details = parsers.parse_assignment(response.text, self.api.site_profile(response.text))
+                if target.due_at is None:
+                    target.due_at = utils.parse_moodle_datetime(details.due_date)
+            else:
+                details = parsers.parse_quiz(response.text, self.api.site_profile(response.text))
+            previous = target.state
+            target.state = _watched_fields(target.kind, details)
+            if previous is not None and previous != target.state:
+                return WatchEvent(kind=target.kind, item_id=target.item_id, changes=[], details=details)
+            return None
+        except (MoodleRequestError, Exception) as e:
+            target.errors += 1
+            logger.error(f"Error polling {target.kind} {target.item_id}: {e}")
+            return None
+
+    def _reschedule(self, target: WatchTarget, changed: bool):
+        if changed:
+            target.changes += 1
+            target.interval = max(self.min_interval, target.interval / 2)
+        else:
+            target.interval = min(self.max_interval, target.interval * 1.5)
+
+        interval = target.interval
+        if target.due_at is not None:
+            remaining = (target.due_at - datetime.now(timezone.utc)).total_seconds()
+            if remaining > 0:
+                # 締切が近いほど間隔を詰める (残り時間の 1/12 以下)
+                interval = min(interval, max(self.min_interval, remaining / 12))
+
+        target.next_poll = time.monotonic() + interval
+        with self._lock:
+            if self.targets.get((target.kind, target.item_id)) is target:
+                self._push(target)